@@ -1,4 +1,6 @@
-from collections import Counter, defaultdict
+import itertools
+import multiprocessing
+from collections import defaultdict
 
 import numpy as np
 import scipy.sparse as sparse
@@ -10,23 +12,62 @@ from metal.utils import arraylike_to_numpy
 ############################################################
 # Label Matrix Diagnostics
 ############################################################
+def _row_label_stats(L, chunk_size=100000):
+    """Returns the number of (non-abstain) votes and the min and max
+    non-abstain label of each row of L, in a single pass over its CSR data
+
+    The rows are processed in chunks of chunk_size, reducing each row's
+    indptr segment of the data with np.minimum/maximum.reduceat, so temporary
+    memory is bounded by the size of a chunk rather than that of L.
+
+    Args:
+        L: an n x m scipy.sparse matrix where L_{i,j} is the label given by the
+            jth LF to the ith item
+        chunk_size: the number of rows to process at a time
+
+    Returns:
+        n_votes, row_min, row_max: [n] np.ndarrays; row_min and row_max are 0
+            for rows without votes
+    """
+    L = sparse.csr_matrix(L)
+    n = L.shape[0]
+    n_votes = np.zeros(n, dtype=int)
+    row_min = np.zeros(n, dtype=L.dtype)
+    row_max = np.zeros(n, dtype=L.dtype)
+    for start in range(0, n, chunk_size):
+        # Slicing copies just this chunk, so dropping its explicit zeros is safe
+        chunk = L[start : start + chunk_size]
+        chunk.eliminate_zeros()
+        counts = np.diff(chunk.indptr)
+        rows = slice(start, start + len(counts))
+        n_votes[rows] = counts
+        has_votes = counts > 0
+        if has_votes.any():
+            offsets = chunk.indptr[:-1][has_votes]
+            row_min[rows][has_votes] = np.minimum.reduceat(chunk.data, offsets)
+            row_max[rows][has_votes] = np.maximum.reduceat(chunk.data, offsets)
+    return n_votes, row_min, row_max
+
+
 def _covered_data_points(L):
     """Returns an indicator vector where ith element = 1 if x_i is labeled by at
     least one LF."""
-    return np.ravel(np.where(L.sum(axis=1) != 0, 1, 0))
+    n_votes, _, _ = _row_label_stats(L)
+    return np.where(n_votes > 0, 1, 0)
 
 
 def _overlapped_data_points(L):
     """Returns an indicator vector where ith element = 1 if x_i is labeled by
     more than one LF."""
-    return np.where(np.ravel((L != 0).sum(axis=1)) > 1, 1, 0)
+    n_votes, _, _ = _row_label_stats(L)
+    return np.where(n_votes > 1, 1, 0)
 
 
 def _conflicted_data_points(L):
     """Returns an indicator vector where ith element = 1 if x_i is labeled by
     at least two LFs that give it disagreeing labels."""
-    m = sparse.diags(np.ravel(L.max(axis=1).todense()))
-    return np.ravel(np.max(m @ (L != 0) != L, axis=1).astype(int).todense())
+    _, row_min, row_max = _row_label_stats(L)
+    return np.where(row_min != row_max, 1, 0)
 
 
 def label_coverage(L):
@@ -57,6 +98,37 @@ def label_conflict(L):
     return _conflicted_data_points(L).sum() / L.shape[0]
 
 
+def _csc_columns(L):
+    """Returns L as a scipy.sparse.csc_matrix without explicit zeros, so that
+    each LF's labels are a contiguous slice of its data, along with the column
+    (LF) index of each of its nonzero entries"""
+    L = sparse.csc_matrix(L)
+    if np.any(L.data == 0):
+        L = L.copy()
+        L.eliminate_zeros()
+    cols = np.repeat(np.arange(L.shape[1]), np.diff(L.indptr))
+    return L, cols
+
+
+def _sum_by_lf(L, cols, v):
+    """Returns the [m] sums of the [nnz] values v over the entries of each LF,
+    where L and cols are as returned by _csc_columns()"""
+    return np.bincount(cols, weights=v, minlength=L.shape[1])
+
+
+def _lf_row_fractions(L, rows, cols=None):
+    """Returns the [m] fractions of all items that are labeled by each LF and
+    are indicated by the [n] boolean np.ndarray rows
+
+    Args:
+        L: an n x m scipy.sparse matrix (if cols is None), or L and cols as
+            returned by _csc_columns()
+    """
+    if cols is None:
+        L, cols = _csc_columns(L)
+    return _sum_by_lf(L, cols, rows[L.indices]) / L.shape[0]
+
+
 def lf_polarities(L):
     """Return the polarities of each LF based on evidence in a label matrix.
 
@@ -64,7 +136,17 @@ def lf_polarities(L):
         L: an n x m scipy.sparse matrix where L_{i,j} is the label given by the
             jth LF to the ith candidate
     """
-    polarities = [sorted(list(set(L[:, i].data))) for i in range(L.shape[1])]
+    L, cols = _csc_columns(L)
+    m = L.shape[1]
+    labels = L.data.astype(int)
+    if not len(labels):
+        return [[] for _ in range(m)]
+
+    # An [m, k] indicator of which (offset) labels each LF emits
+    offset = labels.min()
+    k = labels.max() - offset + 1
+    emitted = np.bincount(cols * k + labels - offset, minlength=m * k) > 0
+    polarities = [list(np.flatnonzero(row) + offset) for row in emitted.reshape(m, k)]
     return [p[0] if len(p) == 1 else p for p in polarities]
 
 
@@ -74,7 +156,8 @@ def lf_coverages(L):
         L: an n x m scipy.sparse matrix where L_{i,j} is the label given by the
             jth LF to the ith candidate
     """
-    return np.ravel((L != 0).sum(axis=0)) / L.shape[0]
+    L, _ = _csc_columns(L)
+    return np.diff(L.indptr) / L.shape[0]
 
 
 def lf_overlaps(L, normalize_by_coverage=False):
@@ -90,9 +173,11 @@ def lf_overlaps(L, normalize_by_coverage=False):
         normalize_by_coverage: Normalize by coverage of the LF, so that it
             returns the percent of LF labels that have overlaps.
     """
-    overlaps = (L != 0).T @ _overlapped_data_points(L) / L.shape[0]
+    n_votes, _, _ = _row_label_stats(L)
+    overlaps = _lf_row_fractions(L, n_votes > 1)
     if normalize_by_coverage:
-        overlaps /= lf_coverages(L)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            overlaps /= lf_coverages(L)
     return np.nan_to_num(overlaps)
 
 
@@ -110,9 +195,11 @@ def lf_conflicts(L, normalize_by_overlaps=False):
         normalize_by_overlaps: Normalize by overlaps of the LF, so that it
             returns the percent of LF overlaps that have conflicts.
     """
-    conflicts = (L != 0).T @ _conflicted_data_points(L) / L.shape[0]
+    _, row_min, row_max = _row_label_stats(L)
+    conflicts = _lf_row_fractions(L, row_min != row_max)
     if normalize_by_overlaps:
-        conflicts /= lf_overlaps(L)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            conflicts /= lf_overlaps(L)
     return np.nan_to_num(conflicts)
 
 
@@ -124,11 +211,11 @@ def lf_empirical_accuracies(L, Y):
             jth LF to the ith candidate
         Y: an [n] or [n, 1] np.ndarray of gold labels
     """
-    # Assume labeled set is small, work with dense matrices
     Y = arraylike_to_numpy(Y)
-    L = L.toarray()
-    X = np.where(L == 0, 0, np.where(L == np.vstack([Y] * L.shape[1]).T, 1, -1))
-    return 0.5 * (X.sum(axis=0) / (L != 0).sum(axis=0) + 1)
+    L, cols = _csc_columns(L)
+    corrects = _sum_by_lf(L, cols, L.data == Y[L.indices])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return corrects / np.diff(L.indptr)
 
 
 def lf_summary(L, Y=None, lf_names=None, est_accs=None):
@@ -140,7 +227,34 @@ def lf_summary(L, Y=None, lf_names=None, est_accs=None):
         Y: an [n] or [n, 1] np.ndarray of gold labels.
             If provided, the empirical accuracy for each LF will be calculated
     """
-    n, m = L.shape
+    # Compute the per-row state in one pass over the rows of L, then convert
+    # to CSC once, so that the per-LF statistics below share both
+    n_votes, row_min, row_max = _row_label_stats(L)
+    L, cols = _csc_columns(L)
+    stats = {
+        "Polarity": lf_polarities(L),
+        "Coverage": lf_coverages(L),
+        "Overlaps": _lf_row_fractions(L, n_votes > 1, cols),
+        "Conflicts": _lf_row_fractions(L, row_min != row_max, cols),
+    }
+
+    if Y is not None:
+        # Correct and incorrect counts exclude items with gold label 0
+        Y = arraylike_to_numpy(Y)
+        Y_entries = Y[L.indices]
+        corrects = _sum_by_lf(L, cols, (L.data == Y_entries) & (Y_entries != 0))
+        incorrects = _sum_by_lf(L, cols, Y_entries != 0) - corrects
+        stats["Correct"] = corrects.astype(int)
+        stats["Incorrect"] = incorrects.astype(int)
+        stats["Emp. Acc."] = lf_empirical_accuracies(L, Y)
+
+    return _summary_frame(stats, lf_names, est_accs)
+
+
+def _summary_frame(stats, lf_names=None, est_accs=None):
+    """Builds the DataFrame returned by lf_summary() from a dict mapping each
+    column name to a list or np.ndarray of per-LF values"""
+    m = len(stats["Polarity"])
     if lf_names is not None:
         col_names = ["j"]
         d = {"j": list(range(m))}
@@ -149,26 +263,9 @@ def lf_summary(L, Y=None, lf_names=None, est_accs=None):
         col_names = []
         d = {}
 
-    # Default LF stats
-    col_names.extend(["Polarity", "Coverage", "Overlaps", "Conflicts"])
-    d["Polarity"] = Series(data=lf_polarities(L), index=lf_names)
-    d["Coverage"] = Series(data=lf_coverages(L), index=lf_names)
-    d["Overlaps"] = Series(data=lf_overlaps(L), index=lf_names)
-    d["Conflicts"] = Series(data=lf_conflicts(L), index=lf_names)
-
-    if Y is not None:
-        col_names.extend(["Correct", "Incorrect", "Emp. Acc."])
-        confusions = [
-            confusion_matrix(Y, L[:, i], pretty_print=False) for i in range(m)
-        ]
-        corrects = [np.diagonal(conf).sum() for conf in confusions]
-        incorrects = [
-            conf.sum() - correct for conf, correct in zip(confusions, corrects)
-        ]
-        accs = lf_empirical_accuracies(L, Y)
-        d["Correct"] = Series(data=corrects, index=lf_names)
-        d["Incorrect"] = Series(data=incorrects, index=lf_names)
-        d["Emp. Acc."] = Series(data=accs, index=lf_names)
+    for col_name, values in stats.items():
+        col_names.append(col_name)
+        d[col_name] = Series(data=values, index=lf_names)
 
     if est_accs is not None:
         col_names.append("Learned Acc.")
@@ -188,6 +285,362 @@ def single_lf_summary(Y_p, Y=None):
     return lf_summary(L, Y)
 
 
+class LFAnalysis(object):
+    """Label matrix diagnostics that are updated incrementally as LFs change
+
+    Holds the per-row state of a label matrix (the number of votes, the votes
+    for each label, and the max and min non-abstain labels of each row) and
+    the per-LF statistics that depend only on each LF's own labels, so that
+    adding, replacing, or removing an LF costs O(nnz) of that LF's column
+    rather than recomputing everything over L. The global statistics
+    (label_coverage(), etc.) are then O(1); the per-LF overlaps and conflicts
+    are counted from the per-row state in one vectorized pass when requested.
+
+    The results match those of the module-level functions on the current L.
+
+    Args:
+        L: an n x m scipy.sparse matrix where L_{i,j} is the label (in
+            {0,...,k}, with 0 = abstain) given by the jth LF to the ith item
+        Y: an [n] or [n, 1] np.ndarray of gold labels (optional; required for
+            the empirical accuracies)
+
+    Example:
+        analysis = LFAnalysis(L_dev, Y_dev)
+        j = analysis.add(new_lf_labels)
+        analysis.replace(j, fixed_lf_labels)
+        analysis.lf_summary()
+    """
+
+    def __init__(self, L, Y=None):
+        n = L.shape[0]
+        self.n = n
+        self.Y = arraylike_to_numpy(Y) if Y is not None else None
+        # The (rows, labels) of the nonzero entries of each LF, and its stats
+        self.columns = []
+        self.column_stats = []
+        # Per-row state; label_votes[i, l - 1] is the number of votes for l
+        self.n_votes = np.zeros(n, dtype=int)
+        self.label_votes = np.zeros((n, 0), dtype=int)
+        self.row_max = np.zeros(n, dtype=int)
+        self.row_min = np.zeros(n, dtype=int)
+        # The number of covered, overlapped, and conflicted rows
+        self.row_counts = np.zeros(3, dtype=int)
+
+        L, _ = _csc_columns(L)
+        for j in range(L.shape[1]):
+            self.add(L[:, j])
+
+    def add(self, labels):
+        """Adds an LF as the last column of L, returning its index
+
+        Args:
+            labels: the LF's labels, as an [n] array-like or n x 1
+                scipy.sparse matrix
+        """
+        self.columns.append(None)
+        self.column_stats.append(None)
+        self._set_column(len(self.columns) - 1, labels)
+        return len(self.columns) - 1
+
+    def replace(self, j, labels):
+        """Replaces the labels of the jth LF (see add())"""
+        self._update_rows(*self.columns[j], sign=-1)
+        self._set_column(j, labels)
+
+    def remove(self, j):
+        """Removes the jth LF; the LFs after it are shifted down by one"""
+        self._update_rows(*self.columns.pop(j), sign=-1)
+        self.column_stats.pop(j)
+
+    def _set_column(self, j, labels):
+        if sparse.issparse(labels):
+            labels = sparse.csc_matrix(labels)
+            rows, values = labels.indices, labels.data.astype(int)
+        else:
+            values = arraylike_to_numpy(labels)
+            rows = np.arange(len(values))
+        keep = values != 0
+        rows, values = rows[keep], values[keep]
+        if np.any(values < 0):
+            raise ValueError("LFAnalysis requires labels in {0,...,k}.")
+
+        self.columns[j] = (rows, values)
+        stats = {"polarity": np.unique(values).tolist(), "coverage": len(rows)}
+        if self.Y is not None:
+            Y_rows = self.Y[rows]
+            stats["correct"] = np.count_nonzero(values == Y_rows)
+            stats["gold"] = np.count_nonzero(Y_rows)
+            stats["gold_correct"] = np.count_nonzero((values == Y_rows) & (Y_rows != 0))
+        self.column_stats[j] = stats
+        self._update_rows(rows, values, sign=1)
+
+    def _update_rows(self, rows, values, sign):
+        """Adds (sign=1) or subtracts (sign=-1) the votes of an LF's entries
+        to the state of the rows it labels"""
+        k = values.max(initial=0)
+        if k > self.label_votes.shape[1]:
+            self.label_votes = np.pad(
+                self.label_votes, ((0, 0), (0, k - self.label_votes.shape[1]))
+            )
+        self.row_counts -= self._row_states(rows).sum(axis=1)
+
+        # Each row appears at most once per LF, so there are no repeats here
+        self.n_votes[rows] += sign
+        self.label_votes[rows, values - 1] += sign
+        voted = self.label_votes[rows] > 0
+        if voted.size == 0:
+            # No labels seen yet (e.g., all LFs so far abstain everywhere)
+            self.row_max[rows] = 0
+            self.row_min[rows] = 0
+        else:
+            has_votes = voted.any(axis=1)
+            k = voted.shape[1]
+            self.row_max[rows] = np.where(
+                has_votes, k - voted[:, ::-1].argmax(axis=1), 0
+            )
+            self.row_min[rows] = np.where(has_votes, voted.argmax(axis=1) + 1, 0)
+
+        self.row_counts += self._row_states(rows).sum(axis=1)
+
+    def _row_states(self, rows=slice(None)):
+        """Returns a [3, len(rows)] indicator of whether each row is covered,
+        overlapped, and conflicted"""
+        return np.stack(
+            [
+                self.n_votes[rows] > 0,
+                self.n_votes[rows] > 1,
+                self.row_min[rows] != self.row_max[rows],
+            ]
+        )
+
+    def _lf_row_counts(self, state):
+        """Returns the [m] number of rows labeled by each LF that are in the
+        given state (see _row_states())"""
+        indicator = self._row_states()[state]
+        return np.array([np.count_nonzero(indicator[rows]) for rows, _ in self.columns])
+
+    def label_coverage(self):
+        """See metal.analysis.label_coverage()"""
+        return self.row_counts[0] / self.n
+
+    def label_overlap(self):
+        """See metal.analysis.label_overlap()"""
+        return self.row_counts[1] / self.n
+
+    def label_conflict(self):
+        """See metal.analysis.label_conflict()"""
+        return self.row_counts[2] / self.n
+
+    def lf_polarities(self):
+        """See metal.analysis.lf_polarities()"""
+        polarities = [stats["polarity"] for stats in self.column_stats]
+        return [p[0] if len(p) == 1 else p for p in polarities]
+
+    def lf_coverages(self):
+        """See metal.analysis.lf_coverages()"""
+        return np.array([stats["coverage"] for stats in self.column_stats]) / self.n
+
+    def lf_overlaps(self, normalize_by_coverage=False):
+        """See metal.analysis.lf_overlaps()"""
+        overlaps = self._lf_row_counts(1) / self.n
+        if normalize_by_coverage:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                overlaps /= self.lf_coverages()
+        return np.nan_to_num(overlaps)
+
+    def lf_conflicts(self, normalize_by_overlaps=False):
+        """See metal.analysis.lf_conflicts()"""
+        conflicts = self._lf_row_counts(2) / self.n
+        if normalize_by_overlaps:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                conflicts /= self.lf_overlaps()
+        return np.nan_to_num(conflicts)
+
+    def lf_empirical_accuracies(self):
+        """See metal.analysis.lf_empirical_accuracies()"""
+        if self.Y is None:
+            raise ValueError("Empirical accuracies require the gold labels Y.")
+        corrects = np.array([stats["correct"] for stats in self.column_stats])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return corrects / (self.lf_coverages() * self.n)
+
+    def lf_summary(self, lf_names=None, est_accs=None):
+        """See metal.analysis.lf_summary()"""
+        stats = {
+            "Polarity": self.lf_polarities(),
+            "Coverage": self.lf_coverages(),
+            "Overlaps": self.lf_overlaps(),
+            "Conflicts": self.lf_conflicts(),
+        }
+        if self.Y is not None:
+            corrects = np.array([s["gold_correct"] for s in self.column_stats])
+            golds = np.array([s["gold"] for s in self.column_stats])
+            stats["Correct"] = corrects.astype(int)
+            stats["Incorrect"] = (golds - corrects).astype(int)
+            stats["Emp. Acc."] = self.lf_empirical_accuracies()
+        return _summary_frame(stats, lf_names, est_accs)
+
+
+def _shard_stats(shard):
+    """Computes the additive label matrix statistics of a shard of rows (see
+    ChunkedLFAnalysis); this is the map step, run in the worker processes
+
+    Args:
+        shard: a tuple (L, Y) of a scipy.sparse matrix (or the path of one
+            saved with scipy.sparse.save_npz) and its gold labels (or None)
+    """
+    L, Y = shard
+    if isinstance(L, str):
+        L = sparse.load_npz(L)
+    n_votes, row_min, row_max = _row_label_stats(L)
+    overlapped = n_votes > 1
+    conflicted = row_min != row_max
+    L, cols = _csc_columns(L)
+    stats = {
+        "n": L.shape[0],
+        "rows": np.array(
+            [np.count_nonzero(n_votes), overlapped.sum(), conflicted.sum()]
+        ),
+        "coverage": np.diff(L.indptr),
+        "overlaps": _sum_by_lf(L, cols, overlapped[L.indices]),
+        "conflicts": _sum_by_lf(L, cols, conflicted[L.indices]),
+        # The unique (LF, label) pairs, for the polarities
+        "polarities": np.unique(np.column_stack([cols, L.data]), axis=0),
+    }
+    if Y is not None:
+        Y_entries = arraylike_to_numpy(Y)[L.indices]
+        correct = L.data == Y_entries
+        stats["correct"] = _sum_by_lf(L, cols, correct)
+        stats["gold_correct"] = _sum_by_lf(L, cols, correct & (Y_entries != 0))
+        stats["gold"] = _sum_by_lf(L, cols, Y_entries != 0)
+    return stats
+
+
+class ChunkedLFAnalysis(object):
+    """Label matrix diagnostics computed as a map-reduce over row shards
+
+    Each shard of rows is summarized independently (optionally in a pool of
+    worker processes) into additive per-LF counts, which are then summed, so
+    the full label matrix never needs to be in memory at once. The results
+    are identical to those of the module-level functions on the full L.
+
+    Args:
+        L: an n x m scipy.sparse matrix, which is split into shards of
+            shard_size rows; or an iterable of row chunks of such a matrix,
+            each either a scipy.sparse matrix or the path of one saved with
+            scipy.sparse.save_npz (which is then loaded by the worker)
+        Y: the [n] gold labels (optional); if L is an iterable of chunks, an
+            iterable of the chunks' gold labels instead
+        n_jobs: the number of worker processes (1 = run in this process)
+        shard_size: the number of rows per shard when L is a matrix
+
+    Example:
+        paths = [f"L_train_{i}.npz" for i in range(100)]
+        analysis = ChunkedLFAnalysis(paths, n_jobs=8)
+        analysis.lf_summary()
+    """
+
+    def __init__(self, L, Y=None, n_jobs=1, shard_size=100000):
+        if sparse.issparse(L):
+            Y = arraylike_to_numpy(Y) if Y is not None else None
+            starts = range(0, L.shape[0], shard_size)
+            chunks = (L[i : i + shard_size] for i in starts)
+            Y_chunks = (
+                Y[i : i + shard_size] if Y is not None else None for i in starts
+            )
+        else:
+            chunks = L
+            Y_chunks = Y if Y is not None else itertools.repeat(None)
+        self.has_gold = Y is not None
+        shards = zip(chunks, Y_chunks)
+
+        if n_jobs > 1:
+            with multiprocessing.Pool(n_jobs) as pool:
+                self.stats = self._reduce(pool.imap(_shard_stats, shards))
+        else:
+            self.stats = self._reduce(map(_shard_stats, shards))
+        self.n = self.stats["n"]
+
+    @staticmethod
+    def _reduce(shard_stats):
+        """Sums the statistics of all shards (see _shard_stats())"""
+        total = None
+        for stats in shard_stats:
+            if total is None:
+                total = stats
+                continue
+            for key, value in stats.items():
+                if key == "polarities":
+                    total[key] = np.unique(np.vstack([total[key], value]), axis=0)
+                else:
+                    total[key] = total[key] + value
+        if total is None:
+            raise ValueError("ChunkedLFAnalysis requires at least one chunk.")
+        return total
+
+    def label_coverage(self):
+        """See metal.analysis.label_coverage()"""
+        return self.stats["rows"][0] / self.n
+
+    def label_overlap(self):
+        """See metal.analysis.label_overlap()"""
+        return self.stats["rows"][1] / self.n
+
+    def label_conflict(self):
+        """See metal.analysis.label_conflict()"""
+        return self.stats["rows"][2] / self.n
+
+    def lf_polarities(self):
+        """See metal.analysis.lf_polarities()"""
+        pairs = self.stats["polarities"]
+        m = len(self.stats["coverage"])
+        splits = np.searchsorted(pairs[:, 0], np.arange(1, m))
+        polarities = [list(p) for p in np.split(pairs[:, 1].astype(int), splits)]
+        return [p[0] if len(p) == 1 else p for p in polarities]
+
+    def lf_coverages(self):
+        """See metal.analysis.lf_coverages()"""
+        return self.stats["coverage"] / self.n
+
+    def lf_overlaps(self, normalize_by_coverage=False):
+        """See metal.analysis.lf_overlaps()"""
+        overlaps = self.stats["overlaps"] / self.n
+        if normalize_by_coverage:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                overlaps /= self.lf_coverages()
+        return np.nan_to_num(overlaps)
+
+    def lf_conflicts(self, normalize_by_overlaps=False):
+        """See metal.analysis.lf_conflicts()"""
+        conflicts = self.stats["conflicts"] / self.n
+        if normalize_by_overlaps:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                conflicts /= self.lf_overlaps()
+        return np.nan_to_num(conflicts)
+
+    def lf_empirical_accuracies(self):
+        """See metal.analysis.lf_empirical_accuracies()"""
+        if not self.has_gold:
+            raise ValueError("Empirical accuracies require the gold labels Y.")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.stats["correct"] / self.stats["coverage"]
+
+    def lf_summary(self, lf_names=None, est_accs=None):
+        """See metal.analysis.lf_summary()"""
+        stats = {
+            "Polarity": self.lf_polarities(),
+            "Coverage": self.lf_coverages(),
+            "Overlaps": self.lf_overlaps(),
+            "Conflicts": self.lf_conflicts(),
+        }
+        if self.has_gold:
+            corrects = self.stats["gold_correct"]
+            stats["Correct"] = corrects.astype(int)
+            stats["Incorrect"] = (self.stats["gold"] - corrects).astype(int)
+            stats["Emp. Acc."] = self.lf_empirical_accuracies()
+        return _summary_frame(stats, lf_names, est_accs)
+
+
 def error_buckets(gold, pred, X=None):
     """Group items by error buckets
 
@@ -209,8 +662,23 @@ def error_buckets(gold, pred, X=None):
     buckets = defaultdict(list)
     gold = arraylike_to_numpy(gold)
     pred = arraylike_to_numpy(pred)
-    for i, (y, l) in enumerate(zip(pred, gold)):
-        buckets[y, l].append(X[i] if X is not None else i)
+    if not len(gold):
+        return buckets
+
+    # Group the indices by (pred, gold) with a stable sort, which keeps them
+    # in their original order within each bucket
+    gold_offset = gold - gold.min()
+    keys = (pred - pred.min()) * (gold_offset.max() + 1) + gold_offset
+    order = np.argsort(keys, kind="stable")
+    starts = np.flatnonzero(np.diff(keys[order])) + 1
+    for idxs in np.split(order, starts):
+        y, l = pred[idxs[0]], gold[idxs[0]]
+        if X is None:
+            buckets[y, l] = idxs.tolist()
+        elif isinstance(X, np.ndarray):
+            buckets[y, l] = list(X[idxs])
+        else:
+            buckets[y, l] = [X[i] for i in idxs]
     return buckets
 
 
@@ -258,7 +726,9 @@ class ConfusionMatrix(object):
                 labels
 
         """
-        self.counter = Counter()
+        # counts[y, l] is the number of items with gold label y and predicted
+        # label l; it is grown as larger labels are added
+        self.counts = np.zeros((0, 0), dtype=int)
         self.mat = None
         self.null_pred = null_pred
         self.null_gold = null_gold
@@ -274,14 +744,17 @@ class ConfusionMatrix(object):
             gold: a np.ndarray of gold labels (ints)
             pred: a np.ndarray of predictions (ints)
         """
-        self.counter.update(zip(gold, pred))
+        gold = np.asarray(gold, dtype=int)
+        pred = np.asarray(pred, dtype=int)
+        k = max(gold.max(initial=0), pred.max(initial=0), len(self.counts) - 1) + 1
+        if k > len(self.counts):
+            pad = k - len(self.counts)
+            self.counts = np.pad(self.counts, ((0, pad), (0, pad)))
+        self.counts += np.bincount(gold * k + pred, minlength=k * k).reshape(k, k)
 
     def compile(self, trim=True):
-        k = max([max(tup) for tup in self.counter.keys()]) + 1  # include 0
-
-        mat = np.zeros((k, k), dtype=int)
-        for (y, l), v in self.counter.items():
-            mat[l, y] = v
+        # Rows are predictions and columns are gold labels
+        mat = self.counts.T.copy()
 
         if trim and not self.null_pred:
             mat = mat[1:, :]
@@ -1,18 +1,39 @@
+import copy
+import math
 import os
 import random
 import warnings
+from contextlib import contextmanager, nullcontext
 
 import numpy as np
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.optim as optim
 from scipy.sparse import issparse
-from torch.utils.data import DataLoader, Dataset, TensorDataset
-
-from metal.analysis import confusion_matrix
-from metal.logging import Checkpointer, Logger, LogWriter, TensorBoardWriter
-from metal.metrics import metric_score
-from metal.utils import place_on_gpu, recursive_merge_dicts
+from torch.utils.data import (
+    DataLoader,
+    Dataset,
+    DistributedSampler,
+    RandomSampler,
+    TensorDataset,
+)
+
+from metal.analysis import ConfusionMatrix
+from metal.logging import (
+    Checkpointer,
+    EarlyStopper,
+    Logger,
+    LogWriter,
+    TensorBoardWriter,
+)
+from metal.metrics import MetricAccumulator
+from metal.utils import (
+    SparseMetalDataset,
+    arraylike_to_numpy,
+    place_on_gpu,
+    recursive_merge_dicts,
+)
 
 # Import tqdm_notebook if in Jupyter notebook
 try:
@@ -60,6 +81,22 @@ class Classifier(nn.Module):
     # the optimizer is used
     implements_l2 = False
 
+    # A class variable indicating whether the class passes the outputs of its
+    # training forward passes to the Logger (see
+    # Logger.accumulate_train_outputs()), as log_train_metrics_mode="running"
+    # requires
+    accumulates_train_outputs = False
+
+    # The components set up by train_model(), which save() leaves out
+    _training_attrs = [
+        "optimizer",
+        "lr_scheduler",
+        "logger",
+        "checkpointer",
+        "writer",
+        "early_stopper",
+    ]
+
     def __init__(self, k, config):
         super().__init__()
         self.config = config
@@ -75,6 +112,11 @@ class Classifier(nn.Module):
         if self.config["device"] != "cpu" and not torch.cuda.is_available():
             raise ValueError("device=cuda but CUDA not available.")
 
+        # Confirm that the precision is supported
+        if self.config.get("precision", "fp32") not in ["fp32", "bf16"]:
+            msg = f"Did not recognize precision option '{self.config['precision']}'"
+            raise ValueError(msg)
+
         # By default, put model in eval mode; switch to train mode in training
         self.eval()
 
@@ -99,7 +141,8 @@ class Classifier(nn.Module):
             Y_p: An n-dim np.ndarray of predictions in {1,...k}
             [Optionally: Y_s: An [n, k] np.ndarray of predicted probabilities]
         """
-        Y_s = self._to_numpy(self.predict_proba(X, **kwargs))
+        with self._inference():
+            Y_s = self._to_numpy(self.predict_proba(X, **kwargs))
         Y_p = self._break_ties(Y_s, break_ties).astype(np.int)
         if return_probs:
             return Y_p, Y_s
@@ -113,6 +156,9 @@ class Classifier(nn.Module):
         break_ties="random",
         verbose=True,
         print_confusion_matrix=True,
+        n_bootstrap=0,
+        alpha=0.05,
+        n_bins=None,
         **kwargs,
     ):
         """Scores the predictive performance of the Classifier on all tasks
@@ -129,28 +175,57 @@ class Classifier(nn.Module):
                 update the class config.
             print_confusion_matrix: Print confusion matrix (overwritten to False if
                 verbose=False)
+            n_bootstrap: If > 0, also compute 1 - alpha confidence intervals
+                from this many bootstrap samples; the data is predicted only
+                once (see metal.metrics.MetricAccumulator)
+            alpha: The significance level of the confidence intervals
+            n_bins: If not None, approximate "roc-auc" from histograms of the
+                probabilities with this many bins, in constant memory, rather
+                than computing it exactly from their ranks
 
         Returns:
             scores: A (float) score or a list of such scores if kwarg metric
-                is a list
+                is a list; if n_bootstrap > 0, each score is instead a
+                (score, lower, upper) tuple
         """
-        Y_p, Y, Y_s = self._get_predictions(
-            data, break_ties=break_ties, return_probs=True, **kwargs
-        )
-
-        # Evaluate on the specified metrics
+        # Evaluate on the specified metrics, streaming over the batches
         return_list = isinstance(metric, list)
         metric_list = metric if isinstance(metric, list) else [metric]
-        scores = []
-        for metric in metric_list:
-            score = metric_score(Y, Y_p, metric, probs=Y_s, ignore_in_gold=[0])
-            scores.append(score)
-            if verbose:
-                print(f"{metric.capitalize()}: {score:.3f}")
+        accumulator = MetricAccumulator(
+            metric_list,
+            ignore_in_gold=[0],
+            n_bins=n_bins,
+            n_bootstrap=n_bootstrap,
+            seed=self.seed,
+        )
+        confusion = ConfusionMatrix()
+        for Y_pb, Yb, Y_sb in self._iter_predictions(
+            data, break_ties=break_ties, **kwargs
+        ):
+            accumulator.update(Yb, Y_pb, Y_sb)
+            if print_confusion_matrix and verbose:
+                confusion.add(arraylike_to_numpy(Yb), arraylike_to_numpy(Y_pb))
+        scores = accumulator.finalize()
+        if n_bootstrap:
+            intervals = accumulator.intervals(alpha)
+            scores = [
+                (score, lower, upper)
+                for score, (lower, upper) in zip(scores, intervals)
+            ]
+        if verbose:
+            for metric, score in zip(metric_list, scores):
+                if n_bootstrap:
+                    score, lower, upper = score
+                    print(
+                        f"{metric.capitalize()}: {score:.3f} "
+                        f"({100 * (1 - alpha):g}% CI: {lower:.3f}-{upper:.3f})"
+                    )
+                else:
+                    print(f"{metric.capitalize()}: {score:.3f}")
 
         # Optionally print confusion matrix
         if print_confusion_matrix and verbose:
-            confusion_matrix(Y, Y_p, pretty_print=True)
+            confusion.display()
 
         # If a single metric was given as a string (not list), return a float
         if len(scores) == 1 and not return_list:
@@ -189,10 +264,19 @@ class Classifier(nn.Module):
         self.train()
         train_config = self.config["train_config"]
 
+        # Set up data-parallel training if applicable
+        self._set_distributed(train_config)
+        accumulation_steps = train_config.get("grad_accumulation_steps", 1)
+        if not isinstance(accumulation_steps, int) or accumulation_steps < 1:
+            msg = f"Invalid grad_accumulation_steps: {accumulation_steps}"
+            raise ValueError(msg)
+
         # Convert data to DataLoaders
         train_loader = self._create_data_loader(train_data)
         valid_loader = self._create_data_loader(valid_data)
         epoch_size = len(train_loader.dataset)
+        if self.world_size > 1:
+            train_loader = self._shard_data_loader(train_loader)
 
         # Move model to GPU
         if self.config["verbose"] and self.config["device"] != "cpu":
@@ -203,6 +287,16 @@ class Classifier(nn.Module):
         self._set_writer(train_config)
         self._set_logger(train_config, epoch_size)
         self._set_checkpointer(train_config)
+        self._set_early_stopper(train_config)
+
+        # Optionally resize train batches to fit the memory budget
+        memory_budget = train_config.get("batch_memory_budget", None)
+        if memory_budget is not None:
+            train_loader = self._resize_data_loader(
+                train_loader, loss_fn, memory_budget
+            )
+            # Start a fresh Logger so that the probe pass is not counted
+            self._set_logger(train_config, epoch_size)
         self._set_optimizer(train_config)
         self._set_scheduler(train_config)
 
@@ -212,14 +306,24 @@ class Classifier(nn.Module):
         else:
             start_iteration = 0
 
+        # Start all processes from the same (rank 0) weights
+        if self.world_size > 1:
+            self._broadcast_state()
+
         # Train the model
         metrics_hist = {}  # The most recently seen value for all metrics
+        loss_tol = train_config.get("loss_tol", None)
+        prev_epoch_loss = None
+        stop_training = False
         for epoch in range(start_iteration, train_config["n_epochs"]):
             progress_bar = (
                 train_config["progress_bar"]
                 and self.config["verbose"]
                 and self.logger.log_unit == "epochs"
+                and self.rank == 0
             )
+            if isinstance(train_loader.sampler, DistributedSampler):
+                train_loader.sampler.set_epoch(epoch)
 
             t = tqdm(
                 enumerate(train_loader),
@@ -229,6 +333,9 @@ class Classifier(nn.Module):
 
             self.running_loss = 0.0
             self.running_examples = 0
+            epoch_loss = 0.0
+            epoch_examples = 0
+            n_batches = len(train_loader)
             for batch_num, data in t:
                 # NOTE: actual batch_size may not equal config's target batch_size
                 batch_size = len(data[0])
@@ -237,39 +344,80 @@ class Classifier(nn.Module):
                 if self.config["device"] != "cpu":
                     data = place_on_gpu(data)
 
-                # Zero the parameter gradients
-                self.optimizer.zero_grad()
+                # Zero the parameter gradients at the start of each window of
+                # accumulated batches (the last window of an epoch may be short)
+                if batch_num % accumulation_steps == 0:
+                    self.optimizer.zero_grad()
+                    window_size = min(accumulation_steps, n_batches - batch_num)
 
                 # Forward pass to calculate the average loss per example
-                loss = loss_fn(*data)
-                if torch.isnan(loss):
-                    msg = "Loss is NaN. Consider reducing learning rate."
-                    raise Exception(msg)
+                with self._autocast():
+                    loss = loss_fn(*data)
 
                 # Backward pass to calculate gradients
-                # Loss is an average loss per example
-                loss.backward()
-
-                # Perform optimizer step
-                self.optimizer.step()
-
-                # Calculate metrics, log, and checkpoint as necessary
-                metrics_dict = self._execute_logging(
-                    train_loader, valid_loader, loss, batch_size
-                )
-                metrics_hist.update(metrics_dict)
+                # Loss is an average loss per example; gradients are summed over
+                # the window, so we scale it to average over the window's batches
+                (loss / window_size).backward()
+                if loss_tol is not None:
+                    epoch_loss += loss.detach() * batch_size
+                    epoch_examples += batch_size
+
+                # Perform optimizer step at the end of each window
+                last_batch = batch_num + 1 == n_batches
+                if (batch_num + 1) % accumulation_steps == 0 or last_batch:
+                    if self.world_size > 1:
+                        self._all_reduce_gradients()
+                    self.optimizer.step()
+
+                # Calculate metrics, log, and checkpoint as necessary; with
+                # data parallelism, this is done by rank 0 alone (on behalf of
+                # all processes' examples)
+                if self.rank == 0:
+                    metrics_dict = self._execute_logging(
+                        train_loader, valid_loader, loss, batch_size * self.world_size
+                    )
+                    metrics_hist.update(metrics_dict)
+                    if self.early_stopper and self.early_stopper.check(metrics_dict):
+                        stop_training = True
 
                 # tqdm output
-                t.set_postfix(loss=metrics_dict["train/loss"])
+                if progress_bar:
+                    t.set_postfix(loss=self._running_average_loss())
+
+                # With data parallelism, processes only agree to stop at the
+                # end of an epoch
+                if stop_training and self.world_size == 1:
+                    break
 
             # Apply learning rate scheduler
             self._update_scheduler(epoch, metrics_hist)
 
+            # Stop once the loss has converged
+            if loss_tol is not None:
+                epoch_loss = float(epoch_loss) / max(epoch_examples, 1)
+                if prev_epoch_loss is not None and abs(
+                    prev_epoch_loss - epoch_loss
+                ) <= loss_tol * abs(prev_epoch_loss):
+                    if self.config["verbose"] and self.rank == 0:
+                        print(f"Loss converged after {epoch + 1} epochs")
+                    stop_training = True
+                prev_epoch_loss = epoch_loss
+
+            if self.world_size > 1:
+                stop_training = self._broadcast_score(float(stop_training)) == 1.0
+            if stop_training:
+                break
+
         self.eval()
 
         # Restore best model if applicable
         if self.checkpointer:
             self.checkpointer.load_best_model(model=self)
+            self.checkpointer.flush()
+
+        # Leave all processes with the final (rank 0) weights
+        if self.world_size > 1:
+            self._broadcast_state()
 
         # Write log if applicable
         if self.writer:
@@ -278,7 +426,7 @@ class Classifier(nn.Module):
             self.writer.close()
 
         # Print confusion matrix if applicable
-        if self.config["verbose"]:
+        if self.config["verbose"] and self.rank == 0:
             print("Finished Training")
             if valid_loader is not None:
                 self.score(
@@ -299,24 +447,78 @@ class Classifier(nn.Module):
     def save(self, destination, **kwargs):
         """Serialize and save a model.
 
+        The model is saved as its state_dict plus a copy of the model (including
+        its config) with the state_dict tensors left out, so that the weights
+        are only stored once and can be memory-mapped by load(). The training
+        components (the optimizer, logger, etc.) are not saved; they are set
+        up again by train_model().
+
         Example:
             end_model = EndModel(...)
             end_model.train_model(...)
             end_model.save("my_end_model.pkl")
         """
-        with open(destination, "wb") as f:
-            torch.save(self, f, **kwargs)
+        state = {"model": self._skeleton(), "state_dict": self.state_dict()}
+        if not isinstance(destination, (str, os.PathLike)):
+            torch.save(state, destination, **kwargs)
+            return
+        # Write to a temporary file first, since destination may be the file
+        # that this model's weights are memory-mapped from (see load())
+        tmp_path = f"{destination}.tmp"
+        try:
+            torch.save(state, tmp_path, **kwargs)
+            os.replace(tmp_path, destination)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     @staticmethod
-    def load(source, **kwargs):
+    def load(source, mmap=True, **kwargs):
         """Deserialize and load a model.
 
+        Args:
+            source: the path of a model saved with save()
+            mmap: if True, memory-map the weights instead of reading them into
+                memory, so that loading is near-instant and processes loading
+                the same file share one copy of the weights
+
         Example:
             end_model = EndModel.load("my_end_model.pkl")
             end_model.score(...)
         """
-        with open(source, "rb") as f:
-            return torch.load(f, **kwargs)
+        kwargs.setdefault("weights_only", False)
+        state = torch.load(source, mmap=mmap, **kwargs)
+        # Models saved with earlier versions of save() are pickled whole
+        if isinstance(state, Classifier):
+            return state
+        model = state["model"]
+        model.load_state_dict(state["state_dict"], assign=True)
+        return model
+
+    def _skeleton(self):
+        """Returns a copy of the model whose state_dict tensors are replaced
+        with (data-free) meta tensors, and whose training components (e.g., the
+        optimizer and its per-parameter state) are set to None"""
+        state_names = set(self.state_dict(keep_vars=True))
+        memo = self._training_memo()
+        for name, tensor in self.named_parameters():
+            if name in state_names:
+                meta = torch.empty_like(tensor, device="meta")
+                memo[id(tensor)] = nn.Parameter(meta, tensor.requires_grad)
+        for name, tensor in self.named_buffers():
+            if name in state_names:
+                memo[id(tensor)] = torch.empty_like(tensor, device="meta")
+        return copy.deepcopy(self, memo)
+
+    def _training_memo(self):
+        """Returns a copy.deepcopy() memo that replaces the training components
+        (see _training_attrs) with None in the copy"""
+        memo = {}
+        for attr in self._training_attrs:
+            value = getattr(self, attr, None)
+            if value is not None:
+                memo[id(value)] = None
+        return memo
 
     def update_config(self, update_dict):
         """Updates self.config with the values in a given update dictionary"""
@@ -365,6 +567,9 @@ class Classifier(nn.Module):
         self.optimizer.load_state_dict(restore_state["optimizer"])
         self.lr_scheduler.load_state_dict(restore_state["lr_scheduler"])
         start_iteration = restore_state["iteration"] + 1
+        # Continue counting from the checkpoint, so that later checkpoints do not
+        # overwrite earlier ones
+        self.logger.unit_total = restore_state["iteration"]
         if self.config["verbose"]:
             print(f"Restored checkpoint to iteration {start_iteration}.")
 
@@ -404,13 +609,16 @@ class Classifier(nn.Module):
         # Return data as DataLoader
         if isinstance(data, DataLoader):
             return data
-        elif isinstance(data, Dataset):
-            return DataLoader(data, **config)
         elif isinstance(data, (tuple, list)):
-            return DataLoader(self._create_dataset(*data), **config)
-        else:
+            data = self._create_dataset(*data)
+        elif not isinstance(data, Dataset):
             raise ValueError("Input data type not recognized.")
 
+        # Sparse datasets slice their rows once per batch
+        if isinstance(data, SparseMetalDataset):
+            config.setdefault("collate_fn", data.collate)
+        return DataLoader(data, **config)
+
     def _set_seed(self, seed):
         self.seed = seed
         if self.config["device"] != "cpu":
@@ -420,8 +628,137 @@ class Classifier(nn.Module):
         np.random.seed(seed)
         random.seed(seed)
 
+    def _set_distributed(self, train_config):
+        if train_config.get("distributed", False):
+            if not dist.is_available() or not dist.is_initialized():
+                msg = (
+                    "distributed=True requires an initialized torch.distributed "
+                    "process group (see metal.utils.launch_distributed)."
+                )
+                raise ValueError(msg)
+            self.rank = dist.get_rank()
+            self.world_size = dist.get_world_size()
+        else:
+            self.rank = 0
+            self.world_size = 1
+
+    def _shard_data_loader(self, data_loader):
+        """Rebuilds a DataLoader so that each process iterates over its own
+        shard of the dataset"""
+        sampler = DistributedSampler(
+            data_loader.dataset,
+            num_replicas=self.world_size,
+            rank=self.rank,
+            shuffle=isinstance(data_loader.sampler, RandomSampler),
+            seed=self.seed,
+        )
+        return self._rebuild_data_loader(data_loader, sampler=sampler)
+
+    def _resize_data_loader(self, data_loader, loss_fn, memory_budget):
+        """Rebuilds a DataLoader with the largest batch size whose inputs and
+        activations fit within memory_budget bytes
+
+        The memory of a batch is measured as the bytes of its inputs plus those
+        of all tensors saved for the backward pass by a forward pass over the
+        first batch, and is extrapolated linearly in the batch size.
+        """
+        if data_loader.batch_size is None:
+            warnings.warn("Cannot resize a DataLoader with a custom batch_sampler.")
+            return data_loader
+
+        data = next(iter(data_loader))
+        if self.config["device"] != "cpu":
+            data = place_on_gpu(data)
+
+        # Bytes of each distinct storage, excluding the model's own parameters
+        param_ptrs = {p.untyped_storage().data_ptr() for p in self.parameters()}
+        storage_bytes = {}
+
+        def add_tensor(tensor):
+            if isinstance(tensor, (list, tuple)):
+                for t in tensor:
+                    add_tensor(t)
+            elif tensor.layout == torch.sparse_csr:
+                add_tensor([tensor.crow_indices(), tensor.col_indices()])
+                add_tensor(tensor.values())
+            elif tensor.layout == torch.sparse_coo:
+                add_tensor([tensor._indices(), tensor._values()])
+            else:
+                storage = tensor.untyped_storage()
+                if storage.data_ptr() not in param_ptrs:
+                    storage_bytes[storage.data_ptr()] = storage.nbytes()
+
+        def pack(tensor):
+            add_tensor(tensor)
+            return tensor
+
+        add_tensor(data)
+        # The probe pass should not update buffers (e.g., batchnorm statistics)
+        buffers = {name: buf.clone() for name, buf in self.named_buffers()}
+        with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+            with self._autocast():
+                loss_fn(*data)
+        self.load_state_dict(buffers, strict=False)
+        bytes_per_example = sum(storage_bytes.values()) / len(data[0])
+
+        batch_size = int(memory_budget // bytes_per_example)
+        batch_size = min(max(batch_size, 1), len(data_loader.sampler))
+        if self.config["verbose"] and self.rank == 0:
+            print(
+                f"Using batch_size={batch_size} "
+                f"(~{bytes_per_example:.0f} bytes per example)"
+            )
+        self.config["train_config"]["data_loader_config"]["batch_size"] = batch_size
+        return self._rebuild_data_loader(
+            data_loader, data_loader.sampler, batch_size=batch_size
+        )
+
+    def _rebuild_data_loader(self, data_loader, sampler, batch_size=None):
+        """Returns a copy of data_loader with the given sampler (and batch_size)"""
+        return DataLoader(
+            data_loader.dataset,
+            batch_size=batch_size or data_loader.batch_size,
+            sampler=sampler,
+            num_workers=data_loader.num_workers,
+            collate_fn=data_loader.collate_fn,
+            pin_memory=data_loader.pin_memory,
+            drop_last=data_loader.drop_last,
+            multiprocessing_context=data_loader.multiprocessing_context,
+            # Avoid restarting the worker processes every epoch
+            persistent_workers=data_loader.num_workers > 0,
+        )
+
+    def _broadcast_state(self):
+        """Overwrites the parameters and buffers of all processes with those of
+        rank 0"""
+        for tensor in self.state_dict().values():
+            dist.broadcast(tensor, src=0)
+
+    def _all_reduce_gradients(self):
+        """Averages the gradients across processes in a single collective"""
+        grads = []
+        for param in self.parameters():
+            if param.requires_grad:
+                # Parameters unused on this batch still join the reduction
+                if param.grad is None:
+                    param.grad = torch.zeros_like(param)
+                grads.append(param.grad)
+        flat_grads = torch.cat([grad.reshape(-1) for grad in grads])
+        dist.all_reduce(flat_grads)
+        flat_grads /= self.world_size
+        offset = 0
+        for grad in grads:
+            grad.copy_(flat_grads[offset : offset + grad.numel()].view_as(grad))
+            offset += grad.numel()
+
+    def _broadcast_score(self, score):
+        """Shares a (possibly missing) rank 0 score with all processes"""
+        score = torch.tensor(float("nan") if score is None else score)
+        dist.broadcast(score, src=0)
+        return None if math.isnan(score) else float(score)
+
     def _set_writer(self, train_config):
-        if train_config["writer"] is None:
+        if train_config["writer"] is None or self.rank != 0:
             self.writer = None
         elif train_config["writer"] == "json":
             self.writer = LogWriter(**(train_config["writer_config"]))
@@ -431,21 +768,38 @@ class Classifier(nn.Module):
             raise Exception(f"Unrecognized writer: {train_config['writer']}")
 
     def _set_logger(self, train_config, epoch_size):
+        logger_config = train_config["logger_config"]
+        mode = logger_config["log_train_metrics_mode"]
+        if mode == "running" and not self.accumulates_train_outputs:
+            raise ValueError(
+                f"log_train_metrics_mode='running' is not supported for "
+                f"{type(self).__name__}; use 'full' or 'sample'."
+            )
         self.logger = Logger(
-            train_config["logger_config"],
+            logger_config,
             self.writer,
             epoch_size,
             verbose=self.config["verbose"],
         )
 
     def _set_checkpointer(self, train_config):
-        if train_config["checkpoint"]:
+        if train_config["checkpoint"] and self.rank == 0:
             self.checkpointer = Checkpointer(
                 train_config["checkpoint_config"], verbose=self.config["verbose"]
             )
         else:
             self.checkpointer = None
 
+    def _set_early_stopper(self, train_config):
+        if train_config.get("early_stopping", False) and self.rank == 0:
+            self.early_stopper = EarlyStopper(
+                train_config["early_stopping_config"],
+                train_config["checkpoint_config"],
+                verbose=self.config["verbose"],
+            )
+        else:
+            self.early_stopper = None
+
     def _set_optimizer(self, train_config):
         optimizer_config = train_config["optimizer_config"]
         opt = optimizer_config["optimizer"]
@@ -518,22 +872,30 @@ class Classifier(nn.Module):
                     checkpoint_config = train_config["checkpoint_config"]
                     metric_name = checkpoint_config["checkpoint_metric"]
                     score = metrics_dict.get(metric_name, None)
+                    if self.world_size > 1:
+                        score = self._broadcast_score(score)
                     if score is not None:
                         self.lr_scheduler.step(score)
                 else:
                     self.lr_scheduler.step()
 
     def _execute_logging(self, train_loader, valid_loader, loss, batch_size):
-        self.eval()
-        self.running_loss += loss.item() * batch_size
+        # Accumulate the loss as a tensor so that we only force a sync (and
+        # only toggle eval/train modes) when a logging event actually fires
+        self.running_loss += loss.detach() * batch_size
         self.running_examples += batch_size
 
         # Initialize metrics dict
         metrics_dict = {}
-        # Always add average loss
-        metrics_dict["train/loss"] = self.running_loss / self.running_examples
 
         if self.logger.check(batch_size):
+            # Always add average loss
+            metrics_dict["train/loss"] = self._running_average_loss()
+            if math.isnan(metrics_dict["train/loss"]):
+                msg = "Loss is NaN. Consider reducing learning rate."
+                raise Exception(msg)
+
+            self.eval()
             logger_metrics = self.logger.calculate_metrics(
                 self, train_loader, valid_loader, metrics_dict
             )
@@ -544,12 +906,19 @@ class Classifier(nn.Module):
             self.running_loss = 0.0
             self.running_examples = 0
 
-        # Checkpoint if applicable
-        self._checkpoint(metrics_dict)
+            # Checkpoint if applicable
+            self._checkpoint(metrics_dict)
+            self.train()
+        elif self.checkpointer and self.checkpointer.checkpoint_every:
+            # Periodic checkpoints do not depend on metrics, so they may come
+            # due between logging events
+            self._checkpoint(metrics_dict)
 
-        self.train()
         return metrics_dict
 
+    def _running_average_loss(self):
+        return float(self.running_loss) / max(self.running_examples, 1)
+
     def _checkpoint(self, metrics_dict):
         if self.checkpointer is None:
             return
@@ -558,47 +927,63 @@ class Classifier(nn.Module):
             metrics_dict, iteration, self, self.optimizer, self.lr_scheduler
         )
 
-    def _get_predictions(self, data, break_ties="random", return_probs=False, **kwargs):
-        """Computes predictions in batch, given a labeled dataset
+    def _iter_predictions(self, data, break_ties="random", **kwargs):
+        """Yields the predictions for a labeled dataset one batch at a time, so
+        that they can be consumed (e.g., scored) in constant memory
 
         Args:
-            data: a Pytorch DataLoader, Dataset, or tuple with Tensors (X,Y):
-                X: The input for the predict method
-                Y: An [n] or [n, 1] torch.Tensor or np.ndarray of target labels
-                    in {1,...,k}
+            data: a Pytorch DataLoader, Dataset, or tuple with Tensors (X,Y)
             break_ties: How to break ties when making predictions
-            return_probs: Return the predicted probabilities as well
 
-        Returns:
-            Y_p: A Tensor of predictions
-            Y: A Tensor of labels
-            [Optionally: Y_s: An [n, k] np.ndarray of predicted probabilities]
+        Yields:
+            (Y_pb, Yb, Y_sb): np.ndarrays of the predictions, labels, and
+                predicted probabilities of a batch (or t-length lists of such
+                in the multi-task setting)
         """
         data_loader = self._create_data_loader(data)
-        Y_p = []
-        Y = []
-        Y_s = []
-
-        # Do batch evaluation by default, getting the predictions and labels
-        for batch_num, data in enumerate(data_loader):
-            Xb, Yb = data
-            Y.append(self._to_numpy(Yb))
-
+        for Xb, Yb in data_loader:
             # Optionally move to device
             if self.config["device"] != "cpu":
                 Xb = place_on_gpu(Xb)
+            # Exit the inference context before yielding to the caller
+            with self._inference():
+                Y_pb, Y_sb = self.predict(
+                    Xb, break_ties=break_ties, return_probs=True, **kwargs
+                )
+            yield tuple(self._batch_to_numpy(Zb) for Zb in [Y_pb, Yb, Y_sb])
 
-            # Append predictions and labels from DataLoader
-            Y_pb, Y_sb = self.predict(
-                Xb, break_ties=break_ties, return_probs=True, **kwargs
-            )
-            Y_p.append(self._to_numpy(Y_pb))
-            Y_s.append(self._to_numpy(Y_sb))
-        Y_p, Y, Y_s = map(self._stack_batches, [Y_p, Y, Y_s])
-        if return_probs:
-            return Y_p, Y, Y_s
+    @staticmethod
+    def _batch_to_numpy(Zb):
+        if isinstance(Zb, list):
+            return [Classifier._to_numpy(Zbt) for Zbt in Zb]
+        return Classifier._to_numpy(Zb)
+
+    def _autocast(self):
+        """A context in which forward passes run in the configured precision
+
+        With precision="bf16", matmul-heavy ops are run in bfloat16 while the
+        parameters themselves stay in fp32, so checkpoints and saved models
+        are interchangeable between precisions.
+        """
+        if self.config.get("precision", "fp32") == "bf16":
+            device_type = "cpu" if self.config["device"] == "cpu" else "cuda"
+            return torch.autocast(device_type=device_type, dtype=torch.bfloat16)
         else:
-            return Y_p, Y
+            return nullcontext()
+
+    @contextmanager
+    def _inference(self):
+        """A context in which the model is in eval mode and autograd is
+        disabled; the previous train/eval mode is restored on exit"""
+        was_training = self.training
+        if was_training:
+            self.eval()
+        try:
+            with torch.inference_mode():
+                yield
+        finally:
+            if was_training:
+                self.train()
 
     def _break_ties(self, Y_s, break_ties="random"):
         """Break ties in each row of a tensor according to the specified policy
@@ -708,16 +1093,3 @@ class Classifier(nn.Module):
         if msg_name not in warnings_given:
             warnings.warn(msg)
         warnings_given.add(msg_name)
-
-    @staticmethod
-    def _stack_batches(X):
-        """Stack a list of np.ndarrays along the first axis, returning an
-        np.ndarray; note this is mainly for smooth hanlding of the multi-task
-        setting."""
-        X = [Classifier._to_numpy(Xb) for Xb in X]
-        if len(X[0].shape) == 1:
-            return np.hstack(X)
-        elif len(X[0].shape) == 2:
-            return np.vstack(X)
-        else:
-            raise ValueError(f"Can't stack {len(X[0].shape)}-dim batches.")
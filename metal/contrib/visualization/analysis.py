@@ -21,7 +21,6 @@ def view_label_matrix(L, colorbar=True):
 
 def view_overlaps(L, self_overlaps=False, normalize=True, colorbar=True):
     """Display an [m, m] matrix of overlaps"""
-    L = L.todense() if sparse.issparse(L) else L
     G = _get_overlaps_matrix(L, normalize=normalize)
     if not self_overlaps:
         np.fill_diagonal(G, 0)  # Zero out self-overlaps
@@ -34,7 +33,6 @@ def view_overlaps(L, self_overlaps=False, normalize=True, colorbar=True):
 
 def view_conflicts(L, normalize=True, colorbar=True):
     """Display an [m, m] matrix of conflicts"""
-    L = L.todense() if sparse.issparse(L) else L
     C = _get_conflicts_matrix(L, normalize=normalize)
     plt.imshow(C, aspect="auto")
     plt.title("Conflicts")
@@ -44,30 +42,46 @@ def view_conflicts(L, normalize=True, colorbar=True):
 
 
 def _get_overlaps_matrix(L, normalize=True):
-    n, m = L.shape
-    X = np.where(L != 0, 1, 0).T
-    G = X @ X.T
+    """Returns the [m, m] matrix of the number of items labeled by each pair
+    of LFs, computed as a sparse product of L's indicator matrix
+
+    Args:
+        L: an [n, m] scipy.sparse matrix or np.ndarray of labels
+        normalize: if True, divide the counts by n
+    """
+    L = sparse.csr_matrix(L)
+    X = (L != 0).astype(int)
+    G = (X.T @ X).toarray()
 
     if normalize:
-        G = G / n
+        G = G / L.shape[0]
     return G
 
 
 def _get_conflicts_matrix(L, normalize=True):
-    n, m = L.shape
-    C = np.zeros((m, m))
-
-    # Iterate over the pairs of LFs
-    for i in range(m):
-        for j in range(m):
-            # Get the overlapping non-zero indices
-            overlaps = list(
-                set(np.where(L[:, i] != 0)[0]).intersection(np.where(L[:, j] != 0)[0])
-            )
-            C[i, j] = np.where(L[overlaps, i] != L[overlaps, j], 1, 0).sum()
+    """Returns the [m, m] matrix of the number of items given different
+    (non-abstain) labels by each pair of LFs
+
+    This is computed without densifying L, as the overlaps minus the
+    agreements, where the agreements are the sum over labels y of the sparse
+    products of the indicator matrices of L == y.
+
+    Args:
+        L: an [n, m] scipy.sparse matrix or np.ndarray of labels
+        normalize: if True, divide the counts by n
+    """
+    L = sparse.coo_matrix(L)
+    C = _get_overlaps_matrix(L, normalize=False)
+    for y in np.setdiff1d(L.data, [0]):
+        is_y = L.data == y
+        X = sparse.csr_matrix(
+            (np.ones(is_y.sum(), dtype=int), (L.row[is_y], L.col[is_y])),
+            shape=L.shape,
+        )
+        C -= (X.T @ X).toarray()
 
     if normalize:
-        C = C / n
+        C = C / L.shape[0]
     return C
 
 
@@ -2,5 +2,12 @@ from .end_model import EndModel
 from .identity_module import IdentityModule
 from .logreg import LogisticRegression
 from .loss import SoftCrossEntropyLoss
+from .sparse_input_module import SparseInputModule
 
-__all__ = ["EndModel", "IdentityModule", "LogisticRegression", "SoftCrossEntropyLoss"]
+__all__ = [
+    "EndModel",
+    "IdentityModule",
+    "LogisticRegression",
+    "SoftCrossEntropyLoss",
+    "SparseInputModule",
+]
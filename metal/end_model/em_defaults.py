@@ -29,6 +29,9 @@ em_default_config = {
     "skip_head": False,
     # Device
     "device": "cpu",
+    # Numerical precision of forward passes: "fp32" or "bf16"; in bf16 mode,
+    # parameters (and so checkpoints) are kept in fp32 and ops are autocast
+    "precision": "fp32",
     # TRAINING
     "train_config": {
         # Loss function config
@@ -37,10 +40,21 @@ em_default_config = {
         "progress_bar": False,
         # Dataloader
         "data_loader_config": {"batch_size": 32, "num_workers": 1, "shuffle": True},
+        # Data-parallel training (requires an initialized torch.distributed
+        # process group, e.g. via metal.utils.launch_distributed); the train
+        # set is sharded across processes and only rank 0 logs, validates
+        # and checkpoints
+        "distributed": False,
         # Loss weights
         "loss_weights": None,
         # Train Loop
         "n_epochs": 10,
+        # Number of batches whose gradients are accumulated per optimizer step
+        "grad_accumulation_steps": 1,
+        # If not None, the train batch_size is replaced with the largest batch
+        # whose inputs and activations fit in this many bytes (probed on the
+        # first batch before training)
+        "batch_memory_budget": None,
         # 'grad_clip': 0.0,
         "l2": 0.0,
         "validation_metric": "accuracy",
@@ -84,6 +98,8 @@ em_default_config = {
                 "loss"
             ],  # Metrics to calculate and report every `log_train_every` units. This can include built-in and user-defined metrics.
             "log_train_metrics_func": None,  # A function or list of functions that map a model + train_loader to a dictionary of custom metrics
+            "log_train_metrics_mode": "full",  # ['full', 'sample', 'running']; how standard train metrics (other than loss) are computed: 'full' re-predicts the whole train set, 'sample' re-predicts a fixed random subset of `log_train_sample_size` examples, and 'running' reuses the outputs of the training forward passes since the last log
+            "log_train_sample_size": 1000,
             "log_valid_every": 1,  # How frequently to evaluate on valid set (must be multiple of log_freq)
             "log_valid_metrics": [
                 "accuracy"
@@ -108,6 +124,16 @@ em_default_config = {
             "checkpoint_metric_mode": "max",  # ['max', 'min']
             "checkpoint_dir": "checkpoints",
             "checkpoint_runway": 0,
+            "checkpoint_async": False,  # If True, keep the best model in memory and write checkpoints from a background thread
+            "checkpoint_keep_last": None,  # If not None, only keep this many of the latest checkpoint_every checkpoints
+            "checkpoint_incremental": False,  # If True, store each tensor once per change and reference it from checkpoints
+        },
+        # Early stopping (uses checkpoint_metric and checkpoint_metric_mode from
+        # checkpoint_config, whether or not checkpoint=True)
+        "early_stopping": False,
+        "early_stopping_config": {
+            "patience": 5,  # Stop after this many evaluations without improvement
+            "min_delta": 0.0,  # The minimum change in the metric counted as improvement
         },
     },
 }
@@ -1,12 +1,22 @@
+import copy
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from scipy.sparse import issparse
 
 from metal.classifier import Classifier
 from metal.end_model.em_defaults import em_default_config
+from metal.end_model.export import export_model
 from metal.end_model.identity_module import IdentityModule
 from metal.end_model.loss import SoftCrossEntropyLoss
-from metal.utils import MetalDataset, pred_to_prob, recursive_merge_dicts
+from metal.utils import (
+    MetalDataset,
+    SparseMetalDataset,
+    pred_to_prob,
+    recursive_merge_dicts,
+    sparse_to_torch,
+)
 
 
 class EndModel(Classifier):
@@ -26,6 +36,9 @@ class EndModel(Classifier):
             softmax that outputs a prediction for the task.
     """
 
+    # This class variable is explained in the Classifier class
+    accumulates_train_outputs = True
+
     def __init__(
         self,
         layer_out_dims,
@@ -186,13 +199,21 @@ class EndModel(Classifier):
         return Y
 
     def _create_dataset(self, *data):
+        # Keep scipy.sparse inputs sparse; batches are sliced in collate
+        if issparse(data[0]):
+            return SparseMetalDataset(*data)
         return MetalDataset(*data)
 
     def _get_loss_fn(self):
         criteria = self.criteria.to(self.config["device"])
-        # This self.preprocess_Y allows us to not handle preprocessing
-        # in a custom dataloader, but decreases speed a bit
-        loss_fn = lambda X, Y: criteria(self.forward(X), self._preprocess_Y(Y, self.k))
+
+        def loss_fn(X, Y):
+            Y_hat = self.forward(X)
+            self.logger.accumulate_train_outputs(Y_hat, Y)
+            # This self.preprocess_Y allows us to not handle preprocessing
+            # in a custom dataloader, but decreases speed a bit
+            return criteria(Y_hat.float(), self._preprocess_Y(Y, self.k))
+
         return loss_fn
 
     def train_model(self, train_data, valid_data=None, log_writer=None, **kwargs):
@@ -217,6 +238,67 @@ class EndModel(Classifier):
             train_loader, loss_fn, valid_data=valid_data, log_writer=log_writer
         )
 
+    def export(self, destination, X, format="torchscript"):
+        """Exports the network and softmax as a standalone artifact for serving
+
+        Args:
+            destination: the path to write the exported model to
+            X: an example [n, ...] input batch for tracing
+            format: "torchscript" or "onnx" (see export.export_model())
+
+        Example:
+            end_model.export("end_model.pt", X_dev[:8])
+            probs = torch.jit.load("end_model.pt")(X_test)
+        """
+        export_model(self, destination, X, format=format)
+
+    def quantize(self, valid_data=None, metric="accuracy", verbose=None):
+        """Returns a copy of the model for CPU inference, with dynamic int8
+        quantization applied to its Linear and LSTM layers
+
+        Args:
+            valid_data: if not None, a tuple of Tensors (X,Y), a Dataset, or a
+                DataLoader on which both models are scored with score(); the
+                scores are stored in the quantization_report of the returned
+                model (and so are saved with it)
+            metric: the metric with which to compare the models
+            verbose: whether to print the comparison (defaults to the config)
+
+        Example:
+            end_model_q = end_model.quantize(valid_data=(X_dev, Y_dev))
+            end_model_q.save("my_end_model_q.pkl")
+        """
+        if verbose is None:
+            verbose = self.config["verbose"]
+
+        # The training components (e.g., the optimizer) are not copied
+        model = copy.deepcopy(self, self._training_memo()).cpu().eval()
+        model.config["device"] = "cpu"
+        model.config["precision"] = "fp32"
+        torch.ao.quantization.quantize_dynamic(
+            model, {nn.Linear, nn.LSTM}, dtype=torch.qint8, inplace=True
+        )
+
+        model.quantization_report = None
+        if valid_data is not None:
+            score = self.score(valid_data, metric=metric, verbose=False)
+            quantized_score = model.score(valid_data, metric=metric, verbose=False)
+            model.quantization_report = {
+                "metric": metric,
+                "score": score,
+                "quantized_score": quantized_score,
+                "delta": quantized_score - score,
+            }
+            if verbose:
+                print(
+                    f"Quantized {metric}: {quantized_score:.3f} "
+                    f"(delta from {score:.3f}: {quantized_score - score:+.3f})"
+                )
+        return model
+
     def predict_proba(self, X):
         """Returns a [n, k] tensor of probs (probabilistic labels)."""
-        return F.softmax(self.forward(X), dim=1).data.cpu().numpy()
+        if issparse(X):
+            X = sparse_to_torch(X).to(self.config["device"])
+        with torch.inference_mode(), self._autocast():
+            return F.softmax(self.forward(X).float(), dim=1).cpu().numpy()
@@ -0,0 +1,122 @@
+import inspect
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class ProbsModule(nn.Module):
+    """Wraps a network so that it outputs probabilities
+
+    The output is an [n, k] tensor of probabilities, or a tuple of t such
+    tensors (one per task) if the network outputs a list (as MTEndModel does).
+    """
+
+    def __init__(self, network):
+        super().__init__()
+        self.network = network
+
+    def forward(self, X):
+        outputs = self.network(X)
+        if isinstance(outputs, (list, tuple)):
+            return tuple(F.softmax(output.float(), dim=1) for output in outputs)
+        return F.softmax(outputs.float(), dim=1)
+
+
+def export_model(model, destination, X, format="torchscript"):
+    """Exports a model's network and softmax as a standalone artifact
+
+    The network is traced on the example batch X, so all Python-level control
+    flow (e.g., MTEndModel's attachment of task heads via its task_map) is
+    resolved at export time. The exported model maps an [n, ...] batch to
+    probabilities as ProbsModule does.
+
+    Args:
+        model: an EndModel or MTEndModel
+        destination: the path to write the exported model to
+        X: an example [n, ...] input batch (of any n) for tracing
+        format: one of:
+            "torchscript": a TorchScript module, loaded with torch.jit.load()
+                (or torch::jit::load() from C++)
+            "onnx": an ONNX graph with input "X" and outputs "probs" (or
+                "probs_0", ... "probs_{t-1}"); requires the onnx package
+    """
+    # Putting the wrapper in eval mode also puts the model in it, so note the
+    # model's mode first
+    was_training = model.training
+    module = ProbsModule(model).eval()
+    try:
+        with torch.no_grad():
+            if format == "torchscript":
+                traced = torch.jit.trace(module, X, check_trace=False)
+                torch.jit.freeze(traced).save(destination)
+            elif format == "onnx":
+                try:
+                    import onnx  # noqa: F401
+                except ImportError:
+                    raise ImportError("Exporting to ONNX requires the onnx package.")
+                outputs = module(X)
+                if isinstance(outputs, tuple):
+                    output_names = [f"probs_{t}" for t in range(len(outputs))]
+                else:
+                    output_names = ["probs"]
+                # Use the TorchScript-based exporter where there is a choice
+                kwargs = {}
+                if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+                    kwargs["dynamo"] = False
+                torch.onnx.export(
+                    module,
+                    (X,),
+                    destination,
+                    input_names=["X"],
+                    output_names=output_names,
+                    dynamic_axes={name: {0: "n"} for name in ["X"] + output_names},
+                    **kwargs,
+                )
+            else:
+                raise ValueError(f"Unrecognized export format: {format}")
+    finally:
+        if was_training:
+            model.train()
+
+
+def benchmark_export(model, source, X, n_requests=100):
+    """Compares the per-request latency of a model and its TorchScript export
+
+    Each request is a single row of X, which is how the models are called in a
+    typical online serving setting.
+
+    Args:
+        model: an EndModel or MTEndModel
+        source: the path of the model exported by export_model()
+        X: an [n, ...] tensor of inputs, whose rows are used as requests
+        n_requests: the number of requests to time for each model
+
+    Returns:
+        A dict mapping "eager" and "exported" to dicts of the p50 and p99
+            latencies (in ms), plus the "speedup" of the p50 latency
+    """
+    exported = torch.jit.load(source)
+    requests = [X[i % len(X)].unsqueeze(0) for i in range(n_requests)]
+
+    def time_requests(predict_fn):
+        latencies = []
+        for request in requests:
+            start = time.perf_counter()
+            predict_fn(request)
+            latencies.append(time.perf_counter() - start)
+        latencies_ms = 1000 * np.array(latencies)
+        return {
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+        }
+
+    with torch.no_grad():
+        results = {
+            "eager": time_requests(model.predict_proba),
+            "exported": time_requests(exported),
+        }
+    results["speedup"] = results["eager"]["p50"] / results["exported"]["p50"]
+    return results
@@ -0,0 +1,56 @@
+import math
+
+import torch
+import torch.nn as nn
+
+
+class SparseInputModule(nn.Module):
+    """An input module that applies a linear layer directly to sparse batches
+
+    This is equivalent to nn.Linear(input_dim, output_dim) applied to the
+    densified input, but only the nonzero features of each row are touched, so
+    it is suitable for e.g. million-feature bag-of-ngrams inputs.
+
+    Args:
+        input_dim: The dimensionality of the (sparse) input
+        output_dim: The output dimensionality of the module
+        sparse_grad: If True, the gradient w.r.t. the weight matrix will be a
+            sparse tensor (requires optimizer="sparseadam" or "sgd")
+    """
+
+    def __init__(self, input_dim, output_dim, sparse_grad=False):
+        super().__init__()
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.W = nn.EmbeddingBag(
+            input_dim,
+            output_dim,
+            mode="sum",
+            sparse=sparse_grad,
+            include_last_offset=True,
+        )
+        self.b = nn.Parameter(torch.Tensor(output_dim))
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        stdv = 1.0 / math.sqrt(self.input_dim)
+        self.W.weight.data.uniform_(-stdv, stdv)
+        self.b.data.uniform_(-stdv, stdv)
+
+    def forward(self, X):
+        """Execute the sparse linear layer
+
+        Args:
+            X: an [n, input_dim] torch.sparse_csr or torch.sparse_coo tensor
+                (e.g., as produced by SparseMetalDataset); dense tensors are
+                also accepted.
+        """
+        if X.layout == torch.sparse_coo:
+            X = X.to_sparse_csr()
+        if X.layout == torch.sparse_csr:
+            values = X.values().to(self.W.weight.dtype)
+            return (
+                self.W(X.col_indices(), X.crow_indices(), per_sample_weights=values)
+                + self.b
+            )
+        return X.to(self.W.weight.dtype) @ self.W.weight + self.b
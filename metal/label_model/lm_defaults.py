@@ -5,6 +5,8 @@ lm_default_config = {
     "show_plots": True,
     # Device (default GPU)
     "device": "cpu",
+    # Numerical precision of forward passes: "fp32" or "bf16"
+    "precision": "fp32",
     # TRAIN
     "train_config": {
         # Dataloader
@@ -27,6 +29,9 @@ lm_default_config = {
         "lr_scheduler": None,
         # Train loop
         "n_epochs": 100,
+        # If not None, stop once the relative change in the epoch loss falls
+        # below this tolerance
+        "loss_tol": None,
         "progress_bar": False,
         # Logger (see metal/logging/writer.py for descriptions)
         "logger": True,
@@ -35,6 +40,8 @@ lm_default_config = {
             "log_train_every": 1,  # How often train loss is reported
             "log_train_metrics": ["train/loss"],
             "log_train_metrics_func": None,
+            "log_train_metrics_mode": "full",
+            "log_train_sample_size": 1000,
             "log_valid_every": 0,
             "log_valid_metrics": [],
             "log_valid_metrics_func": None,
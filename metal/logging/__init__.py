@@ -1,6 +1,14 @@
 from .checkpointer import Checkpointer
+from .early_stopper import EarlyStopper
 from .logger import Logger, Timer
 from .tensorboard import TensorBoardWriter
 from .writer import LogWriter
 
-__all__ = ["Checkpointer", "Logger", "LogWriter", "TensorBoardWriter", "Timer"]
+__all__ = [
+    "Checkpointer",
+    "EarlyStopper",
+    "Logger",
+    "LogWriter",
+    "TensorBoardWriter",
+    "Timer",
+]
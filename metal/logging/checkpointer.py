@@ -1,4 +1,6 @@
 import os
+import threading
+from collections import Counter, OrderedDict
 
 import torch
 
@@ -11,10 +13,20 @@ class Checkpointer(object):
             checkpoint_runway (int): don't save any checkpoints for the first
                 this many iterations
             checkpoint_dir (str): the directory for saving checkpoints
+            checkpoint_async (bool): if True, keep a CPU copy of the best model
+                in memory (so it is restored without reading from disk) and
+                write checkpoints to disk from a background thread
+            checkpoint_keep_last (int): if not None, only keep this many of the
+                most recent checkpoints saved with checkpoint_every
+            checkpoint_incremental (bool): if True, store each model tensor in
+                its own file under checkpoint_dir/tensors, which checkpoints
+                reference; tensors unchanged since they were last stored (e.g.,
+                frozen embeddings) are not written again
         """
         self.best_model_found = None
         self.best_iteration = None
         self.best_score = None
+        self.last_checkpoint_iteration = None
         self.verbose = verbose
 
         self.checkpoint_best = config["checkpoint_best"]
@@ -23,6 +35,25 @@ class Checkpointer(object):
         self.checkpoint_metric_mode = config["checkpoint_metric_mode"]
         self.checkpoint_dir = config["checkpoint_dir"]
         self.checkpoint_runway = config["checkpoint_runway"]
+        self.checkpoint_async = config.get("checkpoint_async", False)
+        self.checkpoint_keep_last = config.get("checkpoint_keep_last", None)
+        self.checkpoint_incremental = config.get("checkpoint_incremental", False)
+
+        # The paths of the retained checkpoints saved with checkpoint_every
+        self.every_paths = []
+
+        # For incremental checkpoints: the file and (storage, version) of each
+        # tensor when it was last stored, and the tensor files referenced by
+        # each checkpoint
+        self.tensor_files = {}
+        self.tensor_versions = {}
+        self.tensor_file_counts = Counter()
+        self.checkpoint_tensor_files = {}
+        self.tensor_file_refs = Counter()
+
+        # The in-memory copy of the best model's state (if checkpoint_async)
+        self.best_state = None
+        self.writer = BackgroundWriter() if self.checkpoint_async else None
 
         # If abbreviated metric name was used, expand here to valid/ by default
         if "/" not in self.checkpoint_metric:
@@ -31,6 +62,17 @@ class Checkpointer(object):
         # Create checkpoint directory if necessary
         if not os.path.exists(self.checkpoint_dir):
             os.makedirs(self.checkpoint_dir)
+        self.tensor_dir = os.path.join(self.checkpoint_dir, "tensors")
+        if self.checkpoint_incremental:
+            if not os.path.exists(self.tensor_dir):
+                os.makedirs(self.tensor_dir)
+            # Number new tensor files after any left by earlier runs (e.g., when
+            # resuming training), which older checkpoints may still reference
+            for tensor_file in os.listdir(self.tensor_dir):
+                name, count, _ = tensor_file.rsplit(".", 2)
+                count = int(count)
+                if count > self.tensor_file_counts[name]:
+                    self.tensor_file_counts[name] = count
 
         # Remind about checkpoint runway
         if self.checkpoint_runway and verbose:
@@ -48,12 +90,20 @@ class Checkpointer(object):
             self.checkpoint_every
             and iteration > 0
             and iteration % self.checkpoint_every == 0
+            and iteration != self.last_checkpoint_iteration
         ):
             # Save the checkpoint regardless of performance
+            self.last_checkpoint_iteration = iteration
             score = None
             state = self.bundle_state(iteration, score, model, optimizer, lr_scheduler)
             checkpoint_path = f"{self.checkpoint_dir}/model_checkpoint_{iteration}.pth"
-            torch.save(state, checkpoint_path)
+            self.save(state, checkpoint_path)
+
+            # Rotate out the oldest checkpoints
+            self.every_paths.append(checkpoint_path)
+            if self.checkpoint_keep_last is not None:
+                while len(self.every_paths) > self.checkpoint_keep_last:
+                    self.delete(self.every_paths.pop(0))
 
         if self.checkpoint_best and self.checkpoint_metric in metrics_dict:
             score = metrics_dict[self.checkpoint_metric]
@@ -72,7 +122,95 @@ class Checkpointer(object):
                     iteration, score, model, optimizer, lr_scheduler
                 )
                 checkpoint_path = f"{self.checkpoint_dir}/best_model.pth"
-                torch.save(state, checkpoint_path)
+                self.best_state = self.save(state, checkpoint_path)
+
+    def save(self, state, checkpoint_path):
+        """Saves state to checkpoint_path, returning the saved state
+
+        If checkpoint_async=True, the state is first copied to CPU memory so
+        that training can continue modifying the model while it is written.
+        """
+        if self.checkpoint_incremental:
+            changed = self._update_tensor_versions(state["model"])
+        if self.checkpoint_async:
+            state = copy_to_cpu(state)
+
+        if self.checkpoint_incremental:
+            # Write out the changed tensors, then reference all tensors by file
+            for name in changed:
+                self._write(state["model"][name], self._tensor_path(name))
+            tensor_files = {name: self.tensor_files[name] for name in state["model"]}
+            # Reference the new files before releasing any overwritten checkpoint
+            self.tensor_file_refs.update(set(tensor_files.values()))
+            self._release(checkpoint_path)
+            self.checkpoint_tensor_files[checkpoint_path] = set(tensor_files.values())
+            stored_state = {**state, "model": {}, "model_files": tensor_files}
+        else:
+            stored_state = state
+        self._write(stored_state, checkpoint_path)
+        return state if self.checkpoint_async else None
+
+    def delete(self, checkpoint_path):
+        """Deletes a checkpoint, along with any tensor files only it references"""
+        self._release(checkpoint_path)
+        self._remove(checkpoint_path)
+
+    def load(self, checkpoint_path, **kwargs):
+        """Loads a checkpoint, resolving references to incrementally-stored
+        tensors; kwargs are passed to torch.load"""
+        # Checkpoints hold non-tensor state (e.g., numpy scores)
+        kwargs.setdefault("weights_only", False)
+        state = torch.load(checkpoint_path, **kwargs)
+        if "model_files" in state:
+            tensor_dir = os.path.join(os.path.dirname(checkpoint_path), "tensors")
+            state["model"] = OrderedDict(
+                (name, torch.load(os.path.join(tensor_dir, tensor_file), **kwargs))
+                for name, tensor_file in state.pop("model_files").items()
+            )
+        return state
+
+    def _update_tensor_versions(self, model_state):
+        """Returns the names of tensors modified since they were last stored,
+        assigning each a new tensor file"""
+        changed = []
+        for name, tensor in model_state.items():
+            # In-place updates (e.g., optimizer steps) bump a tensor's version
+            version = (tensor.data_ptr(), tensor._version)
+            if self.tensor_versions.get(name) != version:
+                self.tensor_versions[name] = version
+                self.tensor_file_counts[name] += 1
+                self.tensor_files[name] = f"{name}.{self.tensor_file_counts[name]}.pt"
+                changed.append(name)
+        return changed
+
+    def _tensor_path(self, name):
+        return os.path.join(self.tensor_dir, self.tensor_files[name])
+
+    def _release(self, checkpoint_path):
+        """Drops the references of a checkpoint to its tensor files, deleting
+        those that are no longer referenced"""
+        for tensor_file in self.checkpoint_tensor_files.pop(checkpoint_path, []):
+            self.tensor_file_refs[tensor_file] -= 1
+            if self.tensor_file_refs[tensor_file] == 0:
+                del self.tensor_file_refs[tensor_file]
+                self._remove(os.path.join(self.tensor_dir, tensor_file))
+
+    def _write(self, obj, path):
+        if self.checkpoint_async:
+            self.writer.save(obj, path)
+        else:
+            torch.save(obj, path)
+
+    def _remove(self, path):
+        if self.checkpoint_async:
+            self.writer.remove(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def flush(self):
+        """Blocks until all pending checkpoints have been written to disk"""
+        if self.writer is not None:
+            self.writer.flush()
 
     def is_best(self, score):
         if self.best_score is None:
@@ -113,15 +251,91 @@ class Checkpointer(object):
                 f"Restoring best model from iteration {self.best_iteration} "
                 f"with score {self.best_score:.3f}"
             )
-            state = torch.load(
-                f"{self.checkpoint_dir}/best_model.pth",
-                map_location=torch.device("cpu"),
-            )
+            if self.best_state is not None:
+                state = self.best_state
+            else:
+                state = self.load(
+                    f"{self.checkpoint_dir}/best_model.pth",
+                    map_location=torch.device("cpu"),
+                )
             self.best_iteration = state["best_iteration"]
             self.best_score = state["best_score"]
             model.load_state_dict(state["model"])
             return model
 
     def restore(self, destination):
-        state = torch.load(f"{destination}")
+        self.flush()
+        state = self.load(f"{destination}")
         return state
+
+
+class BackgroundWriter(object):
+    """Saves objects to disk from a background thread
+
+    Writes are done in the order requested, except that a pending write is
+    replaced (i.e., coalesced) if a newer object is saved to (or a removal is
+    requested for) the same path before it starts. The thread exits whenever
+    there is nothing left to write.
+    """
+
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.error = None
+
+    def __getstate__(self):
+        # Pending writes are flushed rather than pickled
+        self.flush()
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def save(self, obj, path):
+        with self.condition:
+            self.pending.pop(path, None)
+            self.pending[path] = obj
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def remove(self, path):
+        # A pending object of None marks the path for removal
+        self.save(None, path)
+
+    def flush(self):
+        with self.condition:
+            while self.thread is not None:
+                self.condition.wait()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.pending:
+                    self.thread = None
+                    self.condition.notify_all()
+                    return
+                path, obj = self.pending.popitem(last=False)
+            try:
+                if obj is not None:
+                    torch.save(obj, path)
+                elif os.path.exists(path):
+                    os.remove(path)
+            except Exception as e:
+                self.error = e
+
+
+def copy_to_cpu(obj):
+    """Returns a copy of a (nested dict/list of) tensors on the CPU"""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    elif isinstance(obj, dict):
+        return obj.__class__((k, copy_to_cpu(v)) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return obj.__class__(copy_to_cpu(v) for v in obj)
+    else:
+        return obj
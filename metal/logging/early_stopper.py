@@ -0,0 +1,58 @@
+class EarlyStopper(object):
+    def __init__(self, config, checkpoint_config, verbose=True):
+        """Signals the end of training once a reported metric stops improving.
+
+        The metric and its mode are those used for checkpointing, so that the
+        best model seen before stopping is the one that gets checkpointed.
+
+        Args:
+            patience (int): stop after this many consecutive reports of the
+                metric without an improvement
+            min_delta (float): the minimum change in the metric that counts as
+                an improvement
+        """
+        self.best_score = None
+        self.bad_reports = 0
+        self.verbose = verbose
+
+        self.patience = config["patience"]
+        self.min_delta = config["min_delta"]
+        self.metric = checkpoint_config["checkpoint_metric"]
+        self.metric_mode = checkpoint_config["checkpoint_metric_mode"]
+
+        # If abbreviated metric name was used, expand here to valid/ by default
+        if "/" not in self.metric:
+            self.metric = "valid/" + self.metric
+
+        if self.metric_mode not in ["max", "min"]:
+            msg = f"Did not recognize checkpoint_metric_mode: {self.metric_mode}"
+            raise ValueError(msg)
+
+    def check(self, metrics_dict):
+        """Returns True if training should stop."""
+        if self.metric not in metrics_dict:
+            return False
+
+        score = metrics_dict[self.metric]
+        if self.is_improvement(score):
+            self.best_score = score
+            self.bad_reports = 0
+        else:
+            self.bad_reports += 1
+
+        if self.bad_reports >= self.patience:
+            if self.verbose:
+                print(
+                    f"Stopping early: {self.metric} has not improved on "
+                    f"{self.best_score:.3f} in {self.bad_reports} evaluations"
+                )
+            return True
+        return False
+
+    def is_improvement(self, score):
+        if self.best_score is None:
+            return True
+        elif self.metric_mode == "max":
+            return score > self.best_score + self.min_delta
+        else:
+            return score < self.best_score - self.min_delta
@@ -1,7 +1,16 @@
 import time
 from collections import defaultdict
 
-from metal.metrics import METRICS as standard_metric_names, metric_score
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Subset
+
+from metal.metrics import (
+    METRICS as standard_metric_names,
+    MetricAccumulator,
+    metric_scores,
+)
 
 
 class Logger(object):
@@ -34,6 +43,22 @@ class Logger(object):
         # Calculate how many log_train steps to take per log_valid steps
         self.valid_every_X = self._calculate_valid_frequency()
 
+        # Specific to standard train metrics
+        self.train_metrics_mode = self.config["log_train_metrics_mode"]
+        if self.train_metrics_mode not in ["full", "sample", "running"]:
+            raise ValueError(
+                f"Unrecognized log_train_metrics_mode: {self.train_metrics_mode}"
+            )
+        # Only the indices of the train sample are stored, so that the Logger
+        # does not keep the train set alive (e.g., after training ends)
+        self.train_sample_idxs = None
+        self.accumulate_train = self.train_metrics_mode == "running" and any(
+            self.remove_split_prefix(m) in standard_metric_names
+            for m in self.log_train_metrics
+        )
+        self.running_outputs = []
+        self.running_golds = []
+
     def check(self, batch_size):
         """Returns True if the logging frequency has been met."""
         self.increment(batch_size)
@@ -61,6 +86,24 @@ class Logger(object):
         else:
             raise Exception(f"Unrecognized log_unit: {self.log_unit}")
 
+    def accumulate_train_outputs(self, Y_hat, Y):
+        """Store the outputs of a training forward pass and their gold labels
+
+        Only used when log_train_metrics_mode="running" and a standard train
+        metric is logged, in which case those metrics are computed from these
+        outputs at the next log event instead of with an extra pass over the
+        train set.
+
+        Args:
+            Y_hat: An [n, k] torch.Tensor of logits
+            Y: An [n] or [n, k] torch.Tensor of gold (int or prob) labels
+        """
+        if not self.accumulate_train:
+            return
+        # Keep tensors as-is (no device sync) until the next log event
+        self.running_outputs.append(Y_hat.detach().float())
+        self.running_golds.append(Y.detach())
+
     def calculate_metrics(self, model, train_loader, valid_loader, metrics_dict):
         """Add standard and custom metrics to metrics_dict"""
         # Check whether or not it's time for validation as well
@@ -120,24 +163,66 @@ class Logger(object):
 
         # Only calculate predictions if at least one standard metric requires it
         if target_standard_metrics:
+            if split == "train" and self.train_metrics_mode == "running":
+                if not self.running_outputs:
+                    return metrics_dict
+                Y_probs = F.softmax(torch.cat(self.running_outputs), dim=1)
+                Y_probs = Y_probs.cpu().numpy()
+                Y = self._to_labels(torch.cat(self.running_golds).cpu().numpy())
+                Y_preds = model._break_ties(Y_probs).astype(int)
+                self.running_outputs = []
+                self.running_golds = []
+                scores = metric_scores(
+                    Y, Y_preds, target_standard_metrics, probs=Y_probs
+                )
+                for metric, score in zip(target_standard_metrics, scores):
+                    metrics_dict[self.add_split_prefix(metric, split)] = score
+                return metrics_dict
+
+            if split == "train" and self.train_metrics_mode == "sample":
+                data_loader = self._get_train_sample_loader(model, data_loader)
+
             if model.multitask:
-                # For multitask models, use score method for aggregation
-                # This may cause inefficiency if there are multiple desired metrics
-                # and we re-predict for each one.
-                for metric in target_standard_metrics:
-                    score = model.score(data_loader, metric, verbose=False)
+                # For multitask models, use score method for aggregation; it
+                # predicts once and shares the predictions across all metrics
+                scores = model.score(
+                    data_loader, target_standard_metrics, verbose=False
+                )
+                for metric, score in zip(target_standard_metrics, scores):
                     metrics_dict[self.add_split_prefix(metric, split)] = score
             else:
-                # For singletask models, predict once and use Y_probs/Y_preds
-                # for all metrics calculations
-                Y_preds, Y, Y_probs = model._get_predictions(
-                    data_loader, return_probs=True
-                )
-                for metric in target_standard_metrics:
-                    score = metric_score(Y, Y_preds, metric, probs=Y_probs)
+                # For singletask models, predict once and accumulate all
+                # metrics batch by batch
+                accumulator = MetricAccumulator(target_standard_metrics)
+                for Y_preds, Y, Y_probs in model._iter_predictions(data_loader):
+                    accumulator.update(self._to_labels(Y), Y_preds, Y_probs)
+                scores = accumulator.finalize()
+                for metric, score in zip(target_standard_metrics, scores):
                     metrics_dict[self.add_split_prefix(metric, split)] = score
         return metrics_dict
 
+    def _get_train_sample_loader(self, model, train_loader):
+        """Returns a DataLoader over a fixed random subset of the train set"""
+        if self.train_sample_idxs is None:
+            n = len(train_loader.dataset)
+            size = min(self.config["log_train_sample_size"], n)
+            # Use a separate RandomState so as not to perturb training
+            idxs = np.random.RandomState(model.seed).choice(n, size, replace=False)
+            self.train_sample_idxs = np.sort(idxs).tolist()
+        return DataLoader(
+            Subset(train_loader.dataset, self.train_sample_idxs),
+            batch_size=train_loader.batch_size,
+            collate_fn=train_loader.collate_fn,
+        )
+
+    @staticmethod
+    def _to_labels(Y):
+        """Convert [n, k] probabilistic labels (e.g., as used for training) to
+        [n] int labels in {1,...,k}"""
+        if Y.ndim == 2 and Y.shape[1] > 1:
+            return Y.argmax(axis=1) + 1
+        return Y
+
     @staticmethod
     def add_split_prefix(metric, split):
         """Prepend "{split}/" to the metric name if it is not already present"""
@@ -1,8 +1,8 @@
 import numpy as np
-import sklearn.metrics as skm
-import torch
+import scipy.sparse as sparse
+from scipy.stats import rankdata
 
-from metal.utils import arraylike_to_numpy, pred_to_prob
+from metal.utils import arraylike_to_numpy
 
 
 def accuracy_score(gold, pred, ignore_in_gold=[], ignore_in_pred=[]):
@@ -19,14 +19,8 @@ def accuracy_score(gold, pred, ignore_in_gold=[], ignore_in_pred=[]):
     Returns:
         A float, the (micro) accuracy score
     """
-    gold, pred = _preprocess(gold, pred, ignore_in_gold, ignore_in_pred)
-
-    if len(gold) and len(pred):
-        acc = np.sum(gold == pred) / len(gold)
-    else:
-        acc = 0
-
-    return acc
+    C, offset = _confusion_counts(gold, pred, ignore_in_gold, ignore_in_pred)
+    return _score_counts(C, offset, "accuracy")
 
 
 def coverage_score(gold, pred, ignore_in_gold=[], ignore_in_pred=[]):
@@ -43,12 +37,13 @@ def coverage_score(gold, pred, ignore_in_gold=[], ignore_in_pred=[]):
     Returns:
         A float, the (global) coverage score
     """
-    gold, pred = _preprocess(gold, pred, ignore_in_gold, ignore_in_pred)
-
-    return np.sum(pred != 0) / len(pred)
+    C, offset = _confusion_counts(gold, pred, ignore_in_gold, ignore_in_pred)
+    return _score_counts(C, offset, "coverage")
 
 
-def precision_score(gold, pred, pos_label=1, ignore_in_gold=[], ignore_in_pred=[]):
+def precision_score(
+    gold, pred, pos_label=1, average=None, ignore_in_gold=[], ignore_in_pred=[]
+):
     """
     Calculate precision for a single class.
     Args:
@@ -59,26 +54,19 @@ def precision_score(gold, pred, pos_label=1, ignore_in_gold=[], ignore_in_pred=[
         ignore_in_pred: A list of labels for which elements having that pred
             label will be ignored.
         pos_label: The class label to treat as positive for precision
+        average: If not None, how to score all (non-abstain) classes instead
+            of pos_label only (see AVERAGES)
 
     Returns:
         pre: The (float) precision score
     """
-    gold, pred = _preprocess(gold, pred, ignore_in_gold, ignore_in_pred)
-
-    positives = np.where(pred == pos_label, 1, 0).astype(bool)
-    trues = np.where(gold == pos_label, 1, 0).astype(bool)
-    TP = np.sum(positives * trues)
-    FP = np.sum(positives * np.logical_not(trues))
-
-    if TP or FP:
-        pre = TP / (TP + FP)
-    else:
-        pre = 0
-
-    return pre
+    C, offset = _confusion_counts(gold, pred, ignore_in_gold, ignore_in_pred)
+    return _score_counts(C, offset, "precision", pos_label, average=average)
 
 
-def recall_score(gold, pred, pos_label=1, ignore_in_gold=[], ignore_in_pred=[]):
+def recall_score(
+    gold, pred, pos_label=1, average=None, ignore_in_gold=[], ignore_in_pred=[]
+):
     """
     Calculate recall for a single class.
     Args:
@@ -89,27 +77,24 @@ def recall_score(gold, pred, pos_label=1, ignore_in_gold=[], ignore_in_pred=[]):
         ignore_in_pred: A list of labels for which elements having that pred
             label will be ignored.
         pos_label: The class label to treat as positive for recall
+        average: If not None, how to score all (non-abstain) classes instead
+            of pos_label only (see AVERAGES)
 
     Returns:
         rec: The (float) recall score
     """
-    gold, pred = _preprocess(gold, pred, ignore_in_gold, ignore_in_pred)
-
-    positives = np.where(pred == pos_label, 1, 0).astype(bool)
-    trues = np.where(gold == pos_label, 1, 0).astype(bool)
-    TP = np.sum(positives * trues)
-    FN = np.sum(np.logical_not(positives) * trues)
-
-    if TP or FN:
-        rec = TP / (TP + FN)
-    else:
-        rec = 0
-
-    return rec
+    C, offset = _confusion_counts(gold, pred, ignore_in_gold, ignore_in_pred)
+    return _score_counts(C, offset, "recall", pos_label, average=average)
 
 
 def fbeta_score(
-    gold, pred, pos_label=1, beta=1.0, ignore_in_gold=[], ignore_in_pred=[]
+    gold,
+    pred,
+    pos_label=1,
+    beta=1.0,
+    average=None,
+    ignore_in_gold=[],
+    ignore_in_pred=[],
 ):
     """
     Calculate recall for a single class.
@@ -122,61 +107,71 @@ def fbeta_score(
             label will be ignored.
         pos_label: The class label to treat as positive for f-beta
         beta: The beta to use in the f-beta score calculation
+        average: If not None, how to score all (non-abstain) classes instead
+            of pos_label only (see AVERAGES)
 
     Returns:
         fbeta: The (float) f-beta score
     """
-    gold, pred = _preprocess(gold, pred, ignore_in_gold, ignore_in_pred)
-    pre = precision_score(gold, pred, pos_label=pos_label)
-    rec = recall_score(gold, pred, pos_label=pos_label)
-
-    if pre or rec:
-        fbeta = (1 + beta ** 2) * (pre * rec) / ((beta ** 2 * pre) + rec)
-    else:
-        fbeta = 0
-
-    return fbeta
+    C, offset = _confusion_counts(gold, pred, ignore_in_gold, ignore_in_pred)
+    return _score_counts(C, offset, "fbeta", pos_label, beta, average)
 
 
 def f1_score(gold, pred, **kwargs):
     return fbeta_score(gold, pred, beta=1.0, **kwargs)
 
 
-def roc_auc_score(gold, probs, ignore_in_gold=[], ignore_in_pred=[]):
+def roc_auc_score(gold, probs, ignore_in_gold=[], ignore_in_pred=[], n_bins=None):
     """Compute the ROC AUC score, given the gold labels and predicted probs.
 
+    For k classes, this is the mean of the one-vs-rest AUCs of the classes
+    with both positive and negative items (of which there are the same two in
+    the binary case).
+
     Args:
-        gold: A 1d array-like of gold labels
-        probs: A 2d array-like of predicted probabilities
+        gold: A 1d array-like of gold labels in {1,...,k}
+        probs: A 2d array-like of predicted probabilities ([n, k]), or a 1d
+            array-like of the predicted probabilities of label 2 in the binary
+            (k=2) setting
         ignore_in_gold: A list of labels for which elements having that gold
             label will be ignored.
+        n_bins: If None, compute the exact AUC from the ranks of the probs;
+            otherwise, approximate it from histograms of the probs with n_bins
+            bins (see ROCAUCAccumulator), in O(n + k * n_bins) time
 
     Returns:
         roc_auc_score: The (float) roc_auc score
     """
-    gold = arraylike_to_numpy(gold)
-
-    # Filter out the ignore_in_gold (but not ignore_in_pred)
-    # Note the current sub-functions (below) do not handle this...
     if len(ignore_in_pred) > 0:
         raise ValueError("ignore_in_pred not defined for ROC-AUC score.")
-    keep = [x not in ignore_in_gold for x in gold]
-    gold = gold[keep]
-    probs = probs[keep, :]
-
-    # Convert gold to one-hot indicator format, using the k inferred from probs
-    gold_s = pred_to_prob(torch.from_numpy(gold), k=probs.shape[1]).numpy()
-    return skm.roc_auc_score(gold_s, probs)
+    gold = arraylike_to_numpy(gold)
+    probs = np.asarray(probs)
+    if probs.ndim == 1:
+        probs = np.stack([1 - probs, probs], axis=1)
+    if ignore_in_gold:
+        keep = ~np.isin(gold, ignore_in_gold)
+        gold, probs = gold[keep], probs[keep]
+
+    if n_bins is not None:
+        return _binned_auc(*_roc_histograms(gold, _prob_bins(probs, n_bins), n_bins))
+
+    # Mann-Whitney U statistic of each class from the (tie-averaged) ranks of
+    # its probabilities among all items
+    is_pos = gold[:, None] == np.arange(1, probs.shape[1] + 1)
+    P = is_pos.sum(axis=0)
+    N = len(gold) - P
+    valid = (P > 0) & (N > 0)
+    if not valid.any():
+        raise ValueError("ROC-AUC is not defined when only one class is present.")
+    ranks = rankdata(probs[:, valid], axis=0)
+    P, N = P[valid], N[valid]
+    U = (ranks * is_pos[:, valid]).sum(axis=0) - P * (P + 1) / 2
+    return np.mean(U / (P * N))
 
 
 def _drop_ignored(gold, pred, ignore_in_gold, ignore_in_pred):
     """Remove from gold and pred all items with labels designated to ignore."""
-    keepers = np.ones_like(gold).astype(bool)
-    for x in ignore_in_gold:
-        keepers *= np.where(gold != x, 1, 0).astype(bool)
-    for x in ignore_in_pred:
-        keepers *= np.where(pred != x, 1, 0).astype(bool)
-
+    keepers = ~np.isin(gold, ignore_in_gold) & ~np.isin(pred, ignore_in_pred)
     gold = gold[keepers]
     pred = pred[keepers]
     return gold, pred
@@ -190,6 +185,90 @@ def _preprocess(gold, pred, ignore_in_gold, ignore_in_pred):
     return gold, pred
 
 
+def _confusion_counts(gold, pred, ignore_in_gold=[], ignore_in_pred=[]):
+    """Count (gold, pred) label pairs in a single pass
+
+    Returns:
+        C: A square np.ndarray where C[i, j] is the number of items with gold
+            label i + offset and predicted label j + offset
+        offset: The (non-positive) smallest label covered by C, so that the
+            abstain label 0 is always at C[-offset, -offset]
+    """
+    gold, pred = _preprocess(gold, pred, ignore_in_gold, ignore_in_pred)
+    offset = min(0, gold.min(initial=0), pred.min(initial=0))
+    size = max(gold.max(initial=0), pred.max(initial=0)) - offset + 1
+    C = np.bincount((gold - offset) * size + (pred - offset), minlength=size ** 2)
+    return C.reshape(size, size), offset
+
+
+def _safe_divide(num, den):
+    """Elementwise num / den, with 0 wherever den is 0"""
+    num = np.asarray(num, dtype=float)
+    return np.divide(num, den, out=np.zeros_like(num), where=np.asarray(den) > 0)
+
+
+def _score_counts(C, offset, metric, pos_label=1, beta=1.0, average=None):
+    """Computes a (non-probabilistic) metric from the confusion counts C
+
+    Args:
+        C, offset: As returned by _confusion_counts(); C may also be a
+            [..., size, size] stack of confusion counts (e.g., bootstrap
+            samples), in which case an np.ndarray of their scores is returned
+        metric: One of the metrics in METRICS other than "roc-auc"
+        pos_label: The class label to treat as positive for precision, recall,
+            and f-beta (ignored if average is not None)
+        beta: The beta to use in the f-beta score calculation
+        average: One of AVERAGES
+    """
+    n = C.sum(axis=(-2, -1))
+    if metric == "accuracy":
+        return _safe_divide(np.trace(C, axis1=-2, axis2=-1), n)[()]
+    elif metric == "coverage":
+        return _safe_divide(n - C[..., -offset].sum(axis=-1), n)[()]
+    elif metric == "f1":
+        metric, beta = "fbeta", 1.0
+
+    if average not in AVERAGES:
+        raise ValueError(f"Unrecognized average: {average}")
+
+    # Per-class true positives, predicted positives, and gold positives
+    size = C.shape[-1]
+    counts = np.stack(
+        [np.diagonal(C, axis1=-2, axis2=-1), C.sum(axis=-2), C.sum(axis=-1)]
+    )
+    if average is None:
+        labels = np.array([pos_label])
+        if not 0 <= pos_label - offset < size:
+            return np.zeros(C.shape[:-2])[()]
+    else:
+        # All classes (other than abstain) that appear in gold or pred
+        present = (counts[1] + counts[2]).reshape(-1, size).sum(axis=0)
+        labels = np.flatnonzero(present) + offset
+        labels = labels[labels != 0]
+    counts = counts[..., labels - offset]
+    if average == "micro":
+        counts = counts.sum(axis=-1, keepdims=True)
+    TP, P_pred, P_gold = counts
+
+    pre = _safe_divide(TP, P_pred)
+    rec = _safe_divide(TP, P_gold)
+    if metric == "precision":
+        scores = pre
+    elif metric == "recall":
+        scores = rec
+    elif metric == "fbeta":
+        scores = _safe_divide((1 + beta ** 2) * pre * rec, beta ** 2 * pre + rec)
+    else:
+        raise ValueError(f"The metric {metric} cannot be computed from counts.")
+
+    if average == "per_class":
+        return {label: scores[..., i][()] for i, label in enumerate(labels.tolist())}
+    elif average == "macro":
+        return scores.mean(axis=-1)[()] if len(labels) else np.zeros(C.shape[:-2])[()]
+    else:
+        return scores[..., 0][()]
+
+
 METRICS = {
     "accuracy": accuracy_score,
     "coverage": coverage_score,
@@ -201,16 +280,485 @@ METRICS = {
 }
 
 
+def _add_counts(C1, offset1, C2, offset2):
+    """Add two sets of confusion counts (see _confusion_counts()), which may
+    cover different label ranges"""
+    offset = min(offset1, offset2)
+    size = max(len(C1) + offset1, len(C2) + offset2) - offset
+    C = np.zeros((size, size), dtype=int)
+    for Ci, offset_i in [(C1, offset1), (C2, offset2)]:
+        start = offset_i - offset
+        C[start : start + len(Ci), start : start + len(Ci)] += Ci
+    return C, offset
+
+
+def _binned_auc(pos, neg):
+    """Computes the one-vs-rest ROC-AUC of each class from score histograms
+
+    Args:
+        pos: A [k, n_bins] np.ndarray, where pos[j, b] is the number of items
+            with gold label j + 1 whose probability for class j + 1 falls in
+            bin b (of n_bins equal-width bins over [0, 1]); or a
+            [..., k, n_bins] stack of such histograms (e.g., bootstrap
+            samples), in which case an np.ndarray of their AUCs is returned
+        neg: The same, for items with gold labels other than j + 1
+
+    Returns:
+        The mean AUC over the classes with both positive and negative items;
+        items in the same bin are counted as ties
+    """
+    P = pos.sum(axis=-1)
+    N = neg.sum(axis=-1)
+    valid = (P > 0) & (N > 0)
+    if not valid.any():
+        raise ValueError("ROC-AUC is not defined when only one class is present.")
+    neg_below = np.cumsum(neg, axis=-1) - neg
+    area = (pos * (neg_below + 0.5 * neg)).sum(axis=-1)
+    auc = _safe_divide(area, P * N)
+    return _safe_divide((auc * valid).sum(axis=-1), valid.sum(axis=-1))[()]
+
+
+def _prob_bins(probs, n_bins):
+    """Returns the [n, k] indices of the equal-width bins over [0, 1] that the
+    [n, k] probs fall in"""
+    return np.clip((probs * n_bins).astype(int), 0, n_bins - 1)
+
+
+def _rank_bins(probs):
+    """Returns the [n, k] dense ranks of the probs of each class (where equal
+    probs share a rank), and the number of ranks; histograms over these bins
+    give the exact AUC (see _binned_auc())"""
+    ranks = np.column_stack(
+        [np.unique(probs[:, j], return_inverse=True)[1] for j in range(probs.shape[1])]
+    )
+    return ranks, ranks.max(initial=0) + 1
+
+
+def _roc_histograms(gold, bins, n_bins, weights=None):
+    """Returns the [k, n_bins] histograms of the [n, k] bins of the probs of
+    each class for the items of that class (pos) and of all other classes
+    (neg); see _binned_auc()
+
+    If weights (a [B, n] np.ndarray of per-item counts) is given, returns the
+    [B, k, n_bins] stacks of the B correspondingly weighted histograms instead.
+    """
+    k = bins.shape[1]
+    # Flat (class, bin) indices, counted separately for items of each class
+    # (positives) and of all other classes (negatives)
+    bins = bins + np.arange(k) * n_bins
+    is_pos = gold[:, None] == np.arange(1, k + 1)
+    if weights is None:
+        pos = np.bincount(bins[is_pos], minlength=k * n_bins).reshape(k, n_bins)
+        neg = np.bincount(bins[~is_pos], minlength=k * n_bins).reshape(k, n_bins)
+        return pos, neg
+
+    histograms = []
+    for mask in [is_pos, ~is_pos]:
+        # An [n, k * n_bins] indicator matrix of each item's (class, bin)s
+        rows, cols = np.nonzero(mask)
+        H = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=int), (rows, bins[rows, cols])),
+            shape=(len(gold), k * n_bins),
+        )
+        histograms.append((H.T @ weights.T).T.reshape(-1, k, n_bins))
+    return histograms
+
+
+def _percentile_interval(samples, alpha):
+    """Returns the (lower, upper) bounds of the central 1 - alpha interval of
+    an np.ndarray of bootstrap samples"""
+    lower, upper = np.percentile(samples, [50 * alpha, 100 - 50 * alpha])
+    return lower, upper
+
+
+class ConfusionAccumulator(object):
+    """Accumulates the confusion counts of batches of labels, from which all
+    metrics other than "roc-auc" can be computed in constant memory
+
+    Args:
+        ignore_in_gold: A list of labels for which elements having that gold
+            label will be ignored.
+        ignore_in_pred: A list of labels for which elements having that pred
+            label will be ignored.
+        n_samples: The number of bootstrap samples to draw in bootstrap()
+        random_state: The np.random.RandomState to draw bootstrap samples from
+    """
+
+    def __init__(
+        self, ignore_in_gold=[], ignore_in_pred=[], n_samples=0, random_state=None
+    ):
+        self.ignore_in_gold = ignore_in_gold
+        self.ignore_in_pred = ignore_in_pred
+        self.n_samples = n_samples
+        self.random_state = random_state or np.random.RandomState()
+        self.C = np.zeros((1, 1), dtype=int)
+        self.offset = 0
+        self.C_samples = None
+
+    def update(self, gold, pred, probs=None):
+        C, offset = _confusion_counts(
+            gold, pred, self.ignore_in_gold, self.ignore_in_pred
+        )
+        self.C, self.offset = _add_counts(self.C, self.offset, C, offset)
+        self.C_samples = None
+
+    def finalize(self, metric, **kwargs):
+        """Returns the score of the counts so far (see _score_counts())"""
+        return _score_counts(self.C, self.offset, metric, **kwargs)
+
+    def bootstrap(self, metric, **kwargs):
+        """Returns an [n_samples] np.ndarray of the scores of bootstrap
+        resamples of the items so far
+
+        Resampling n items with replacement is equivalent to drawing the
+        confusion counts of the resample from a multinomial distribution with
+        the observed cell frequencies, so no per-item data is needed; the
+        resampled counts are shared by all metrics.
+        """
+        if self.C_samples is None:
+            n = self.C.sum()
+            self.C_samples = self.random_state.multinomial(
+                n, self.C.ravel() / max(n, 1), size=self.n_samples
+            ).reshape((self.n_samples,) + self.C.shape)
+        return _score_counts(self.C_samples, self.offset, metric, **kwargs)
+
+
+class ROCAUCAccumulator(object):
+    """Accumulates batches of items, from which the ROC-AUC is computed
+
+    By default, the gold labels and predicted probabilities of all items are
+    kept, and the AUC is exact (see roc_auc_score()). If n_bins is given, only
+    per-class histograms of the probabilities are kept, in constant memory,
+    and the AUC is approximate.
+
+    Args:
+        n_bins: If not None, the number of equal-width probability bins; the
+            AUC is then exact up to items of different classes whose
+            probabilities share a bin
+        ignore_in_gold: A list of labels for which elements having that gold
+            label will be ignored.
+        ignore_in_pred: Not supported (must be empty)
+        n_samples: The number of bootstrap samples for bootstrap(); the items
+            are resampled with replacement, or if n_bins is not None, each
+            item is counted Poisson(1) times in each sample, which
+            approximates resampling with replacement in a single pass
+        random_state: The np.random.RandomState to draw bootstrap samples from
+        n_bootstrap_bins: If n_bins is not None, the number of bins for the
+            bootstrap samples, whose histograms take [n_samples, k,
+            n_bootstrap_bins] memory
+    """
+
+    # The max number of histogram entries (or item weights) per chunk of the
+    # exact bootstrap samples
+    bootstrap_chunk_size = 2 ** 24
+
+    def __init__(
+        self,
+        n_bins=None,
+        ignore_in_gold=[],
+        ignore_in_pred=[],
+        n_samples=0,
+        random_state=None,
+        n_bootstrap_bins=1000,
+    ):
+        if len(ignore_in_pred) > 0:
+            raise ValueError("ignore_in_pred not defined for ROC-AUC score.")
+        self.n_bins = n_bins
+        self.ignore_in_gold = ignore_in_gold
+        self.n_samples = n_samples
+        self.random_state = random_state or np.random.RandomState()
+        self.n_bootstrap_bins = n_bootstrap_bins
+        self.golds = []
+        self.probs = []
+        self.pos = None
+        self.neg = None
+        self.pos_samples = None
+        self.neg_samples = None
+
+    def update(self, gold, pred=None, probs=None):
+        gold = arraylike_to_numpy(gold)
+        probs = np.asarray(probs)
+        keep = ~np.isin(gold, self.ignore_in_gold)
+        gold, probs = gold[keep], probs[keep]
+
+        if self.n_bins is None:
+            self.golds.append(gold)
+            self.probs.append(probs)
+            return
+
+        pos, neg = _roc_histograms(gold, _prob_bins(probs, self.n_bins), self.n_bins)
+        if self.pos is None:
+            self.pos, self.neg = pos, neg
+        else:
+            self.pos += pos
+            self.neg += neg
+
+        if self.n_samples:
+            # Items with the same gold label and bins are interchangeable, so
+            # draw the total count of each such group, Poisson(group size)
+            n_bins = self.n_bootstrap_bins
+            groups, sizes = np.unique(
+                np.column_stack([gold, _prob_bins(probs, n_bins)]),
+                axis=0,
+                return_counts=True,
+            )
+            weights = self.random_state.poisson(sizes, (self.n_samples, len(sizes)))
+            pos, neg = _roc_histograms(groups[:, 0], groups[:, 1:], n_bins, weights)
+            if self.pos_samples is None:
+                self.pos_samples, self.neg_samples = pos, neg
+            else:
+                self.pos_samples += pos
+                self.neg_samples += neg
+
+    def finalize(self, metric="roc-auc", **kwargs):
+        """Returns the ROC-AUC of the items so far"""
+        if self.n_bins is None:
+            if not self.golds:
+                raise ValueError("ROC-AUC is not defined for an empty set of items.")
+            return roc_auc_score(np.concatenate(self.golds), np.concatenate(self.probs))
+        if self.pos is None:
+            raise ValueError("ROC-AUC is not defined for an empty set of items.")
+        return _binned_auc(self.pos, self.neg)
+
+    def bootstrap(self, metric="roc-auc", **kwargs):
+        """Returns an [n_samples] np.ndarray of the ROC-AUCs of the bootstrap
+        samples of the items so far"""
+        if self.n_bins is not None:
+            if self.pos_samples is None:
+                raise ValueError("ROC-AUC is not defined for an empty set of items.")
+            return _binned_auc(self.pos_samples, self.neg_samples)
+
+        if not self.golds:
+            raise ValueError("ROC-AUC is not defined for an empty set of items.")
+        gold = np.concatenate(self.golds)
+        # With one bin per distinct probability, the histograms are exact
+        bins, n_bins = _rank_bins(np.concatenate(self.probs))
+        chunk_size = max(
+            1, self.bootstrap_chunk_size // max(len(gold), bins.shape[1] * n_bins)
+        )
+        samples = []
+        for start in range(0, self.n_samples, chunk_size):
+            size = min(chunk_size, self.n_samples - start)
+            # Resample the items with replacement, as counts per item
+            n = len(gold)
+            idxs = self.random_state.randint(n, size=(size, n))
+            idxs += np.arange(size)[:, None] * n
+            weights = np.bincount(idxs.ravel(), minlength=size * n).reshape(size, n)
+            pos, neg = _roc_histograms(gold, bins, n_bins, weights)
+            samples.append(np.atleast_1d(_binned_auc(pos, neg)))
+        return np.concatenate(samples)
+
+
+class MetricAccumulator(object):
+    """Accumulates batches of labels and predictions, then scores them on a
+    list of metrics; memory use is independent of the number of items, except
+    for an exact "roc-auc" (see ROCAUCAccumulator)
+
+    Args:
+        metrics: A list of metric names (see METRICS)
+        ignore_in_gold: A list of labels for which elements having that gold
+            label will be ignored.
+        ignore_in_pred: A list of labels for which elements having that pred
+            label will be ignored.
+        n_bins: If not None, the number of bins used to approximate "roc-auc"
+            in constant memory (see ROCAUCAccumulator)
+        n_bootstrap: If > 0, the number of bootstrap samples to use for the
+            confidence intervals returned by intervals()
+        seed: The random seed for the bootstrap samples
+
+    Example:
+        accumulator = MetricAccumulator(["accuracy", "roc-auc"])
+        for gold, pred, probs in batches:
+            accumulator.update(gold, pred, probs)
+        accuracy, roc_auc = accumulator.finalize()
+    """
+
+    def __init__(
+        self,
+        metrics,
+        ignore_in_gold=[],
+        ignore_in_pred=[],
+        n_bins=None,
+        n_bootstrap=0,
+        seed=None,
+    ):
+        for metric in metrics:
+            if metric not in METRICS:
+                msg = f"The metric you provided ({metric}) is not supported."
+                raise ValueError(msg)
+        self.metrics = metrics
+        self.n_bootstrap = n_bootstrap
+        random_state = np.random.RandomState(seed)
+        # One accumulator per type, shared by all metrics of that type
+        self.accumulators = {}
+        for metric in metrics:
+            accumulator_class = ACCUMULATORS[metric]
+            if accumulator_class in self.accumulators:
+                continue
+            kwargs = (
+                {"n_bins": n_bins} if accumulator_class is ROCAUCAccumulator else {}
+            )
+            self.accumulators[accumulator_class] = accumulator_class(
+                ignore_in_gold=ignore_in_gold,
+                ignore_in_pred=ignore_in_pred,
+                n_samples=n_bootstrap,
+                random_state=random_state,
+                **kwargs,
+            )
+
+    def update(self, gold, pred, probs=None):
+        """Adds a batch of gold labels, predicted labels, and (if "roc-auc" is
+        among the metrics) predicted probabilities"""
+        if ROCAUCAccumulator in self.accumulators and probs is None:
+            raise ValueError("ROC-AUC score requries the predicted probs.")
+        for accumulator in self.accumulators.values():
+            accumulator.update(gold, pred, probs)
+
+    def finalize(self, **kwargs):
+        """Returns a list of scores, one per metric; kwargs are as for
+        metric_scores()"""
+        return [
+            self.accumulators[ACCUMULATORS[metric]].finalize(metric, **kwargs)
+            for metric in self.metrics
+        ]
+
+    def intervals(self, alpha=0.05, **kwargs):
+        """Returns a list of the (lower, upper) bounds of the 1 - alpha
+        bootstrap percentile confidence interval of each metric"""
+        if not self.n_bootstrap:
+            raise ValueError("Confidence intervals require n_bootstrap > 0.")
+        return [
+            _percentile_interval(
+                self.accumulators[ACCUMULATORS[metric]].bootstrap(metric, **kwargs),
+                alpha,
+            )
+            for metric in self.metrics
+        ]
+
+
+# The options for the average kwarg of precision, recall, and f-beta:
+#   None: score the pos_label class only
+#   "micro": pool the counts of all (non-abstain) classes, then score
+#   "macro": take the unweighted mean of the per-class scores
+#   "per_class": return a dict mapping each class to its score
+AVERAGES = [None, "micro", "macro", "per_class"]
+
+
+# The accumulator class used for each metric (see MetricAccumulator)
+ACCUMULATORS = {
+    "accuracy": ConfusionAccumulator,
+    "coverage": ConfusionAccumulator,
+    "precision": ConfusionAccumulator,
+    "recall": ConfusionAccumulator,
+    "f1": ConfusionAccumulator,
+    "fbeta": ConfusionAccumulator,
+    "roc-auc": ROCAUCAccumulator,
+}
+
+
 def metric_score(gold, pred, metric, probs=None, **kwargs):
     if metric not in METRICS:
         msg = f"The metric you provided ({metric}) is not supported."
         raise ValueError(msg)
+    return metric_scores(gold, pred, [metric], probs=probs, **kwargs)[0]
 
-    # Note special handling because requires the predicted probabilities
-    elif metric == "roc-auc":
-        if probs is None:
-            raise ValueError("ROC-AUC score requries the predicted probs.")
-        return roc_auc_score(gold, probs, **kwargs)
 
-    else:
-        return METRICS[metric](gold, pred, **kwargs)
+def metric_scores(
+    gold, pred, metrics, probs=None, ignore_in_gold=[], ignore_in_pred=[], **kwargs
+):
+    """Computes a list of metrics, sharing one pass over gold and pred
+
+    The labels are converted, filtered, and counted into a confusion matrix
+    once, and all metrics other than "roc-auc" are derived from those counts.
+
+    Args:
+        gold: A 1d array-like of gold labels
+        pred: A 1d array-like of predicted labels (assuming abstain = 0)
+        metrics: A list of metric names (see METRICS)
+        probs: A 2d array-like of predicted probabilities (required for
+            "roc-auc" only)
+        ignore_in_gold: A list of labels for which elements having that gold
+            label will be ignored.
+        ignore_in_pred: A list of labels for which elements having that pred
+            label will be ignored.
+        kwargs: The pos_label, beta, and/or average to use for precision,
+            recall, and f-beta, and the n_bins to use for "roc-auc"
+
+    Returns:
+        A list of scores, one per metric
+    """
+    for metric in metrics:
+        if metric not in METRICS:
+            msg = f"The metric you provided ({metric}) is not supported."
+            raise ValueError(msg)
+    n_bins = kwargs.pop("n_bins", None)
+    if set(kwargs) - {"pos_label", "beta", "average"}:
+        raise TypeError(f"Unexpected keyword arguments: {list(kwargs)}")
+
+    if any(metric != "roc-auc" for metric in metrics):
+        C, offset = _confusion_counts(gold, pred, ignore_in_gold, ignore_in_pred)
+
+    scores = []
+    for metric in metrics:
+        # Note special handling because requires the predicted probabilities
+        if metric == "roc-auc":
+            if probs is None:
+                raise ValueError("ROC-AUC score requries the predicted probs.")
+            score = roc_auc_score(
+                gold, probs, ignore_in_gold, ignore_in_pred, n_bins=n_bins
+            )
+        else:
+            score = _score_counts(C, offset, metric, **kwargs)
+        scores.append(score)
+    return scores
+
+
+def bootstrap_scores(
+    gold,
+    pred,
+    metrics,
+    probs=None,
+    n_bootstrap=1000,
+    alpha=0.05,
+    seed=None,
+    ignore_in_gold=[],
+    ignore_in_pred=[],
+    **kwargs,
+):
+    """Computes a list of metrics along with bootstrap confidence intervals
+
+    The B = n_bootstrap resampled scores are computed from resampled confusion
+    counts (and, for "roc-auc", weighted probability histograms) all at once,
+    rather than by rescoring B resampled datasets.
+
+    Args:
+        gold, pred, metrics, probs, ignore_in_gold, ignore_in_pred, kwargs: As
+            for metric_scores()
+        n_bootstrap: The number of bootstrap samples
+        alpha: The confidence intervals cover the central 1 - alpha of the
+            bootstrap distribution of each metric
+        seed: The random seed for the bootstrap samples
+
+    Returns:
+        A list of (score, lower, upper) tuples, one per metric
+    """
+    scores = metric_scores(
+        gold,
+        pred,
+        metrics,
+        probs=probs,
+        ignore_in_gold=ignore_in_gold,
+        ignore_in_pred=ignore_in_pred,
+        **kwargs,
+    )
+    accumulator = MetricAccumulator(
+        metrics,
+        ignore_in_gold=ignore_in_gold,
+        ignore_in_pred=ignore_in_pred,
+        n_bins=kwargs.pop("n_bins", None),
+        n_bootstrap=n_bootstrap,
+        seed=seed,
+    )
+    accumulator.update(gold, pred, probs)
+    intervals = accumulator.intervals(alpha, **kwargs)
+    return [(score, lower, upper) for score, (lower, upper) in zip(scores, intervals)]
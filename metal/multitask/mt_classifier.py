@@ -1,7 +1,7 @@
 import numpy as np
 
 from metal.classifier import Classifier
-from metal.metrics import metric_score
+from metal.metrics import MetricAccumulator, metric_score
 from metal.multitask.utils import MultiXYDataset, MultiYDataset
 
 
@@ -35,6 +35,9 @@ class MTClassifier(Classifier):
         K: (list) A t-length list of cardinalities (ints) for each task
     """
 
+    # This class variable is explained in the Classifier class
+    accumulates_train_outputs = False
+
     def __init__(self, K, config):
         Classifier.__init__(self, None, config)
         self.multitask = True
@@ -62,7 +65,8 @@ class MTClassifier(Classifier):
             [Optionally: Y_s: A t-length list of [n, K_t] np.ndarrays of
                 predicted probabilities]
         """
-        Y_s = self.predict_proba(X, **kwargs)
+        with self._inference():
+            Y_s = self.predict_proba(X, **kwargs)
         self._check(Y_s, typ=list)
         self._check(Y_s[0], typ=np.ndarray)
 
@@ -85,6 +89,7 @@ class MTClassifier(Classifier):
         break_ties="random",
         verbose=True,
         print_confusion_matrix=False,
+        n_bins=None,
         **kwargs,
     ):
         """Scores the predictive performance of the Classifier on all tasks
@@ -93,64 +98,84 @@ class MTClassifier(Classifier):
                 X: The input for the predict method
                 Y: A t-length list of [n] or [n, 1] np.ndarrays or
                    torch.Tensors of gold labels in {1,...,K_t}
-            metric: The metric with which to score performance on each task
+            metric: The metric with which to score performance on each task,
+                or a list of such metrics
             validation_task:
                 int: returns score for specific task number.
             reduce: How to reduce the scores of multiple tasks:
                  None : return a t-length list of scores
                 'mean': return the mean score across tasks
             break_ties: How to break ties when making predictions
+            n_bins: If not None, the number of bins used to approximate
+                "roc-auc" (see Classifier.score())
         Returns:
             scores: A (float) score or a t-length list of such scores if
-                reduce=None
+                reduce=None; or a list of these (one per metric) if kwarg
+                metric is a list
+
+        NOTE: Predictions are computed once and shared by all metrics, which
+        are accumulated batch by batch in constant memory (except for an exact
+        "roc-auc").
         """
-        Y_p, Y, Y_s = self._get_predictions(
-            data, break_ties=break_ties, return_probs=True, **kwargs
+        # Evaluate on the specified metrics, streaming over the batches
+        return_list = isinstance(metric, list)
+        metric_list = metric if isinstance(metric, list) else [metric]
+        accumulators = None
+        for Y_pb, Yb, Y_sb in self._iter_predictions(
+            data, break_ties=break_ties, **kwargs
+        ):
+            if accumulators is None:
+                accumulators = [
+                    MetricAccumulator(metric_list, ignore_in_gold=[0], n_bins=n_bins)
+                    for _ in Y_pb
+                ]
+            tasks = range(len(Y_pb)) if validation_task is None else [validation_task]
+            for t in tasks:
+                accumulators[t].update(Yb[t], Y_pb[t], Y_sb[t])
+        scores = self._reduce_scores(
+            accumulators, metric_list, validation_task, reduce, verbose
         )
 
-        # TODO: Handle multiple metrics...
-        metric_list = metric if isinstance(metric, list) else [metric]
-        if len(metric_list) > 1:
-            raise NotImplementedError(
-                "Multiple metrics for multi-task score() not yet supported."
-            )
-        metric = metric_list[0]
+        # If a single metric was given as a string (not list), return a score
+        if len(scores) == 1 and not return_list:
+            return scores[0]
+        else:
+            return scores
 
-        # Return score for task t only.
+    def _reduce_scores(
+        self, accumulators, metric_list, validation_task, reduce, verbose
+    ):
+        """Scores the t-length list of MetricAccumulators filled by score() on
+        a list of metrics, returning a list of scores (one per metric)"""
+        # Return scores for task t only.
         if validation_task is not None:
-            score = metric_score(
-                Y[validation_task],
-                Y_p[validation_task],
-                metric,
-                probs=Y_s[validation_task],
-                ignore_in_gold=[0],
-            )
+            scores = accumulators[validation_task].finalize()
             if verbose:
-                print(f"{metric.capitalize()}: {score:.3f}")
-            return score
+                for metric, score in zip(metric_list, scores):
+                    print(f"{metric.capitalize()}: {score:.3f}")
+            return scores
 
-        task_scores = []
-        for t, Y_tp in enumerate(Y_p):
-            score = metric_score(Y[t], Y_tp, metric, probs=Y_s[t], ignore_in_gold=[0])
-            task_scores.append(score)
+        # A [t, len(metric_list)] array of scores
+        task_scores = np.array([accumulator.finalize() for accumulator in accumulators])
 
         # TODO: Other options for reduce, including scoring only certain
         # primary tasks, and converting to end labels using TaskGraph...
         if reduce is None:
-            score = task_scores
+            scores = [list(metric_task_scores) for metric_task_scores in task_scores.T]
         elif reduce == "mean":
-            score = np.mean(task_scores)
+            scores = list(task_scores.mean(axis=0))
         else:
             raise Exception(f"Keyword reduce='{reduce}' not recognized.")
 
         if verbose:
-            if reduce is None:
-                for t, score_t in enumerate(score):
-                    print(f"{metric.capitalize()} (t={t}): {score_t:0.3f}")
-            else:
-                print(f"{metric.capitalize()}: {score:.3f}")
+            for metric, score in zip(metric_list, scores):
+                if reduce is None:
+                    for t, score_t in enumerate(score):
+                        print(f"{metric.capitalize()} (t={t}): {score_t:0.3f}")
+                else:
+                    print(f"{metric.capitalize()}: {score:.3f}")
 
-        return score
+        return scores
 
     def score_task(self, X, Y, t=0, metric="accuracy", verbose=True, **kwargs):
         """Scores the predictive performance of the Classifier on task t
@@ -224,10 +249,3 @@ class MTClassifier(Classifier):
             return [Classifier._to_numpy(z) for z in Z]
         else:
             return Classifier._to_numpy(Z)
-
-    @staticmethod
-    def _stack_batches(X):
-        """Given a list of batches, each consisting of a T-len list of
-        np.ndarrays, stack along the first (batch) axis, returning a T-len list
-        of np.ndarrays."""
-        return [Classifier._stack_batches(Xt) for Xt in zip(*X)]
@@ -297,15 +297,17 @@ class MTEndModel(MTClassifier, EndModel):
         """Returns the loss function to use in the train_model routine"""
         criteria = self.criteria.to(self.config["device"])
         loss_fn = lambda X, Y: sum(
-            criteria(Y_tp, Y_t) for Y_tp, Y_t in zip(self.forward(X), Y)
+            criteria(Y_tp.float(), Y_t) for Y_tp, Y_t in zip(self.forward(X), Y)
         )
         return loss_fn
 
     def predict_proba(self, X):
         """Returns a list of t [n, K_t] tensors of probabilistic (float) predictions."""
-        return [
-            F.softmax(output, dim=1).data.cpu().numpy() for output in self.forward(X)
-        ]
+        with torch.inference_mode(), self._autocast():
+            return [
+                F.softmax(output.float(), dim=1).cpu().numpy()
+                for output in self.forward(X)
+            ]
 
     def predict_task_proba(self, X, t):
         """Returns an n x k matrix of probabilities for each label of task t"""
@@ -0,0 +1,165 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import scipy.sparse as sparse
+import torch
+
+
+class InferenceServer(object):
+    """Serves per-example predictions from a Classifier in micro-batches
+
+    Requests (single examples) are queued and run through the model's
+    predict_proba() by a worker thread in batches of up to max_batch_size,
+    where a batch is closed early once its first request has waited
+    max_latency seconds. This amortizes the per-call overhead of predict_proba
+    across concurrent requests.
+
+    Args:
+        model: a Classifier (e.g., an EndModel, MTEndModel, or LabelModel)
+        max_batch_size: the maximum number of requests per batch
+        max_latency: the maximum time (in seconds) that a request waits for
+            other requests to batch with
+
+    Example:
+        with InferenceServer(end_model, max_batch_size=64) as server:
+            probs = server.predict(x)  # or: await server.predict_async(x)
+        print(server.stats())
+    """
+
+    def __init__(self, model, max_batch_size=64, max_latency=0.005):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.requests = queue.Queue()
+        self.thread = None
+        self.reset_stats()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Starts the worker thread"""
+        if self.thread is None:
+            self.model.eval()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Serves all queued requests, then stops the worker thread"""
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, x):
+        """Queues a request for a single example x
+
+        Args:
+            x: a single example, in the format of one row of the model's
+                predict_proba() input (a torch.Tensor, np.ndarray, or
+                scipy.sparse row)
+
+        Returns:
+            A concurrent.futures.Future of the example's k-dim np.ndarray of
+                probabilities (or a t-length list of such, for multitask models)
+        """
+        future = Future()
+        self.requests.put((x, future, time.perf_counter()))
+        return future
+
+    def predict(self, x, timeout=None):
+        """Returns the probabilities for a single example x (see submit())"""
+        return self.submit(x).result(timeout=timeout)
+
+    async def predict_async(self, x):
+        """Awaitable version of predict()"""
+        return await asyncio.wrap_future(self.submit(x))
+
+    def reset_stats(self):
+        self.latencies = []
+        self.batch_sizes = []
+        self.first_request_time = None
+        self.last_response_time = None
+
+    def stats(self):
+        """Returns the p50 and p99 latency (in ms) of the requests served so far,
+        along with their throughput (requests per second) and mean batch size"""
+        if not self.latencies:
+            return {}
+        latencies_ms = 1000 * np.array(self.latencies)
+        elapsed = self.last_response_time - self.first_request_time
+        return {
+            "requests": len(self.latencies),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "throughput": len(self.latencies) / max(elapsed, 1e-9),
+            "mean_batch_size": float(np.mean(self.batch_sizes)),
+        }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            request = self.requests.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = request[2] + self.max_latency
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self.requests.get(
+                        timeout=max(deadline - time.perf_counter(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+            self._serve(batch)
+
+        # Serve any requests still queued after the stop signal
+        while not self.requests.empty():
+            request = self.requests.get()
+            if request is not None:
+                self._serve([request])
+
+    def _serve(self, batch):
+        xs, futures, request_times = zip(*batch)
+        try:
+            Y_s = self.model.predict_proba(self._stack(xs))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        response_time = time.perf_counter()
+        for i, future in enumerate(futures):
+            if isinstance(Y_s, list):
+                future.set_result([Y_ts[i] for Y_ts in Y_s])
+            else:
+                future.set_result(Y_s[i])
+
+        # Record stats
+        if self.first_request_time is None:
+            self.first_request_time = min(request_times)
+        self.last_response_time = response_time
+        self.latencies.extend(response_time - t for t in request_times)
+        self.batch_sizes.append(len(batch))
+
+    @staticmethod
+    def _stack(xs):
+        """Stacks single examples into a batch of the same type"""
+        if isinstance(xs[0], torch.Tensor):
+            return torch.stack(xs)
+        elif sparse.issparse(xs[0]):
+            return sparse.vstack(xs).tocsr()
+        else:
+            return np.stack(xs)
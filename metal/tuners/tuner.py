@@ -1,6 +1,5 @@
 import json
 import os
-import pickle
 import random
 from itertools import cycle, product
 from time import strftime, time
@@ -188,12 +187,11 @@ class ModelTuner(object):
         return score, model
 
     def _save_best_model(self, model):
-        with open(self.save_path, "wb") as f:
-            pickle.dump(model, f)
+        model.save(self.save_path)
 
     def _load_best_model(self, clean_up=False):
-        with open(self.save_path, "rb") as f:
-            model = pickle.load(f)
+        # The file may be cleaned up, so the weights are not memory-mapped
+        model = self.model_class.load(self.save_path, mmap=False)
         if clean_up:
             self._clean_up()
         return model
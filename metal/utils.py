@@ -1,9 +1,13 @@
 import copy
+import os
 import random
+import socket
 from collections import defaultdict
 
 import numpy as np
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 from scipy.sparse import issparse
 from torch.utils.data import Dataset
 
@@ -29,6 +33,54 @@ class MetalDataset(Dataset):
         return len(self.X)
 
 
+class SparseMetalDataset(Dataset):
+    """A dataset that groups each row of a scipy.sparse X with its label from Y
+
+    Unlike MetalDataset, X is never densified. Items are row indices, and the
+    collate() method (pass it as the DataLoader's collate_fn) slices the CSR
+    matrix once per batch and returns the rows as a torch.sparse_csr tensor.
+
+    Args:
+        X: an [n, d] scipy.sparse matrix
+        Y: a torch.Tensor of labels
+            This may be predicted (int) labels [n] or probabilistic (float) labels [n, k]
+    """
+
+    def __init__(self, X, Y):
+        self.X = X.tocsr()
+        self.Y = torch.as_tensor(Y)
+        assert self.X.shape[0] == len(self.Y)
+
+    def __getitem__(self, index):
+        return index
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def collate(self, indices):
+        return tuple([sparse_to_torch(self.X[indices]), self.Y[indices]])
+
+
+def sparse_to_torch(X, dtype=torch.float):
+    """Converts a scipy.sparse matrix to a torch.sparse_csr tensor
+
+    The crow_indices, col_indices, and values of the returned tensor are the
+    offsets, indices, and per-sample weights expected by nn.EmbeddingBag.
+
+    Args:
+        X: an [n, d] scipy.sparse matrix
+        dtype: the torch dtype of the nonzero values
+    """
+    X = X.tocsr()
+    return torch.sparse_csr_tensor(
+        torch.from_numpy(X.indptr.astype(np.int64)),
+        torch.from_numpy(X.indices.astype(np.int64)),
+        torch.from_numpy(X.data).to(dtype),
+        size=X.shape,
+        check_invariants=False,
+    )
+
+
 def rargmax(x, eps=1e-8):
     """Argmax with random tie-breaking
 
@@ -91,7 +143,7 @@ def arraylike_to_numpy(array_like):
         raise ValueError("Input could not be converted to 1d np.array")
 
     # Convert to ints
-    if any(array_like % 1):
+    if array_like.dtype.kind not in "biu" and np.any(array_like % 1):
         raise ValueError("Input contains at least one non-integer value.")
     array_like = array_like.astype(np.dtype(int))
 
@@ -357,3 +409,40 @@ def place_on_gpu(data):
         return data.cuda()
     else:
         return ValueError(f"Data type {type(data)} not recognized.")
+
+
+def launch_distributed(fn, world_size, args=(), backend="gloo"):
+    """Runs fn(*args) in world_size local processes joined in a process group
+
+    Each process is given an equal share of the available CPU threads, so that
+    e.g. a model trained with train_config["distributed"]=True scales across
+    the cores of one machine.
+
+    Args:
+        fn: A picklable (i.e. module-level) function to run in each process;
+            the rank of a process is available as torch.distributed.get_rank()
+        world_size: The number of processes to launch
+        args: A tuple of arguments passed to fn
+        backend: The torch.distributed backend to use
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    init_method = f"tcp://127.0.0.1:{port}"
+    num_threads = max(1, (os.cpu_count() or 1) // world_size)
+    mp.spawn(
+        _distributed_worker,
+        args=(fn, world_size, args, backend, init_method, num_threads),
+        nprocs=world_size,
+    )
+
+
+def _distributed_worker(rank, fn, world_size, args, backend, init_method, num_threads):
+    torch.set_num_threads(num_threads)
+    dist.init_process_group(
+        backend, init_method=init_method, rank=rank, world_size=world_size
+    )
+    try:
+        fn(*args)
+    finally:
+        dist.destroy_process_group()
@@ -47,7 +47,7 @@ setuptools.setup(
         "networkx>=2.2",
         "numpy",
         "pandas",
-        "torch>=1.0",
+        "torch>=2.1",
         "scipy",
         "tqdm",
         "scikit-learn",
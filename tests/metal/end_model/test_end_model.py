@@ -1,13 +1,39 @@
 import os
+import tempfile
 import unittest
 
 import numpy as np
+import scipy.sparse as sparse
 import torch
 import torch.nn as nn
 
-from metal.end_model import EndModel, LogisticRegression
+from metal.end_model import EndModel, LogisticRegression, SparseInputModule
+from metal.end_model.export import benchmark_export
 from metal.end_model.identity_module import IdentityModule
-from metal.metrics import METRICS
+from metal.metrics import METRICS, roc_auc_score
+from metal.utils import launch_distributed
+
+
+def _train_distributed(Xs, Ys, out_dir):
+    """Trains an EndModel in each process of a process group"""
+    em = EndModel(
+        seed=1,
+        input_batchnorm=True,
+        layer_out_dims=[2, 10, 2],
+        verbose=False,
+    )
+    em.train_model(
+        (Xs[0], Ys[0]),
+        valid_data=(Xs[1], Ys[1]),
+        n_epochs=5,
+        distributed=True,
+        data_loader_config={"num_workers": 0},
+        checkpoint=True,
+        checkpoint_dir=os.path.join(out_dir, "checkpoints"),
+    )
+    score = em.score((Xs[2], Ys[2]), verbose=False)
+    rank = torch.distributed.get_rank()
+    torch.save((float(score), em.state_dict()), os.path.join(out_dir, f"{rank}.pt"))
 
 
 class EndModelTest(unittest.TestCase):
@@ -136,6 +162,25 @@ class EndModelTest(unittest.TestCase):
         for i, metric in enumerate(metrics):
             self.assertGreater(scores[i], 0.95)
 
+        # ROC-AUC is exact unless binning is requested
+        Y_p, Y_s = em.predict(Xs[2], return_probs=True)
+        roc_auc = em.score((Xs[2], Ys[2]), metric="roc-auc", verbose=False)
+        self.assertEqual(roc_auc, roc_auc_score(Ys[2], Y_s))
+        roc_auc_binned = em.score(
+            (Xs[2], Ys[2]), metric="roc-auc", n_bins=100, verbose=False
+        )
+        self.assertEqual(roc_auc_binned, roc_auc_score(Ys[2], Y_s, n_bins=100))
+
+        # Bootstrap confidence intervals around the same point estimates
+        intervals = em.score(
+            (Xs[2], Ys[2]), metric=metrics, n_bootstrap=200, verbose=False
+        )
+        for score, (point, lower, upper) in zip(scores, intervals):
+            self.assertAlmostEqual(score, point)
+            self.assertLessEqual(lower, point)
+            self.assertGreaterEqual(upper, point)
+            self.assertLess(upper - lower, 0.1)
+
     def test_determinism(self):
         """Test whether training and scoring is deterministic given seed"""
         em = EndModel(
@@ -169,6 +214,261 @@ class EndModelTest(unittest.TestCase):
         score_3 = em_2.score((Xs[2], Ys[2]), verbose=False)
         self.assertEqual(score_1, score_3)
 
+    def test_inference(self):
+        """Test that predictions run without autograd and restore train mode"""
+        em = EndModel(
+            seed=1, input_dropout=0.5, layer_out_dims=[2, 10, 2], verbose=False
+        )
+        Xs, Ys = self.single_problem
+        em.train_model(
+            (Xs[0], Ys[0]), valid_data=(Xs[1], Ys[1]), n_epochs=3, checkpoint=False
+        )
+
+        # Predictions are made in eval mode (no dropout), so are deterministic
+        em.train()
+        _, Y_s_1 = em.predict(Xs[2], return_probs=True)
+        _, Y_s_2 = em.predict(Xs[2], return_probs=True)
+        self.assertTrue(em.training)
+        self.assertTrue(np.array_equal(Y_s_1, Y_s_2))
+
+        # Batched predictions cover the full set
+        batches = list(em._iter_predictions((Xs[2], Ys[2])))
+        self.assertTrue(em.training)
+        Y_p, Y, Y_s = [np.concatenate(Z) for Z in zip(*batches)]
+        self.assertEqual(Y_p.shape, (len(Ys[2]),))
+        self.assertEqual(Y_s.shape, (len(Ys[2]), 2))
+        self.assertEqual(sorted(Y), sorted(Ys[2].numpy()))
+        em.eval()
+
+    def test_bf16(self):
+        """Test training and inference in bfloat16 with fp32 parameters"""
+        em = EndModel(
+            seed=1,
+            batchnorm=False,
+            dropout=0.0,
+            layer_out_dims=[2, 10, 2],
+            precision="bf16",
+            verbose=False,
+        )
+        Xs, Ys = self.single_problem
+        em.train_model(
+            (Xs[0], Ys[0]), valid_data=(Xs[1], Ys[1]), n_epochs=5, checkpoint=False
+        )
+        score = em.score((Xs[2], Ys[2]), verbose=False)
+        self.assertGreater(score, 0.95)
+        self.assertTrue(all(p.dtype == torch.float for p in em.parameters()))
+        self.assertEqual(em.predict_proba(Xs[2]).dtype, np.float32)
+
+        # The weights can be used as-is in full precision
+        em.config["precision"] = "fp32"
+        self.assertGreater(em.score((Xs[2], Ys[2]), verbose=False), 0.95)
+
+        with self.assertRaises(ValueError):
+            EndModel(layer_out_dims=[2, 10, 2], precision="fp8", verbose=False)
+
+    def test_grad_accumulation(self):
+        """Test that accumulating batches matches training on larger batches"""
+        Xs, Ys = self.single_problem
+        ems = []
+        for batch_size, steps in [(32, 1), (8, 4)]:
+            em = EndModel(
+                seed=1,
+                batchnorm=False,
+                dropout=0.0,
+                layer_out_dims=[2, 10, 2],
+                verbose=False,
+            )
+            em.train_model(
+                (Xs[0], Ys[0]),
+                n_epochs=2,
+                grad_accumulation_steps=steps,
+                data_loader_config={"batch_size": batch_size, "shuffle": False},
+                checkpoint=False,
+            )
+            # Every example is still counted once per epoch
+            self.assertEqual(em.logger.example_total, 2 * len(Xs[0]))
+            ems.append(em)
+        for p_1, p_2 in zip(ems[0].parameters(), ems[1].parameters()):
+            self.assertTrue(torch.allclose(p_1, p_2, atol=1e-5))
+
+    def test_batch_memory_budget(self):
+        """Test that the probed batch size grows with the memory budget"""
+        Xs, Ys = self.single_problem
+        batch_sizes = []
+        for budget in [1, 2 ** 14, 2 ** 30]:
+            em = EndModel(seed=1, layer_out_dims=[2, 10, 2], verbose=False)
+            em.train_model(
+                (Xs[0], Ys[0]),
+                n_epochs=1,
+                batch_memory_budget=budget,
+                checkpoint=False,
+            )
+            batch_sizes.append(
+                em.config["train_config"]["data_loader_config"]["batch_size"]
+            )
+            self.assertEqual(em.logger.example_total, len(Xs[0]))
+        self.assertEqual(batch_sizes[0], 1)
+        self.assertGreater(batch_sizes[1], 1)
+        self.assertLess(batch_sizes[1], len(Xs[0]))
+        self.assertEqual(batch_sizes[2], len(Xs[0]))
+
+    def test_early_stopping(self):
+        """Test that training stops once the checkpoint metric stops improving"""
+        em = EndModel(seed=1, layer_out_dims=[2, 10, 2], verbose=False)
+        Xs, Ys = self.single_problem
+        # With min_delta=1.0, no evaluation after the first counts as improving
+        em.train_model(
+            (Xs[0], Ys[0]),
+            valid_data=(Xs[1], Ys[1]),
+            n_epochs=10,
+            early_stopping=True,
+            early_stopping_config={"patience": 2, "min_delta": 1.0},
+            checkpoint=False,
+        )
+        self.assertEqual(em.logger.unit_total, 3)
+
+    def test_distributed(self):
+        """Test data-parallel training across two processes"""
+        Xs, Ys = self.single_problem
+        with tempfile.TemporaryDirectory() as out_dir:
+            launch_distributed(_train_distributed, 2, args=(Xs, Ys, out_dir))
+            score_0, state_0 = torch.load(os.path.join(out_dir, "0.pt"))
+            score_1, state_1 = torch.load(os.path.join(out_dir, "1.pt"))
+            # Only rank 0 checkpoints
+            self.assertEqual(
+                os.listdir(os.path.join(out_dir, "checkpoints")), ["best_model.pth"]
+            )
+        self.assertGreater(score_0, 0.95)
+        self.assertEqual(score_0, score_1)
+        for name, tensor in state_0.items():
+            self.assertTrue(torch.equal(tensor, state_1[name]))
+
+    def test_sparse_input(self):
+        """Test training and scoring on scipy.sparse inputs without densifying"""
+        Xs, Ys = self.single_problem
+        # Encode each point as a sparse one-hot of its (x1, x2) grid cell
+        Xs_sparse = []
+        for X in Xs:
+            cells = ((X.numpy() + 1) * 5).astype(int).clip(0, 9)
+            cols = cells[:, 0] * 10 + cells[:, 1]
+            rows = np.arange(len(X))
+            data = np.ones(len(X))
+            Xs_sparse.append(
+                sparse.csr_matrix((data, (rows, cols)), shape=(len(X), 100))
+            )
+
+        em = EndModel(
+            seed=1,
+            input_module=SparseInputModule(100, 10),
+            layer_out_dims=[10, 2],
+            verbose=False,
+        )
+        em.train_model(
+            (Xs_sparse[0], Ys[0]),
+            valid_data=(Xs_sparse[1], Ys[1]),
+            n_epochs=10,
+            checkpoint=False,
+        )
+        score = em.score((Xs_sparse[2], Ys[2]), verbose=False)
+        self.assertGreater(score, 0.9)
+
+        # Direct prediction on a scipy.sparse matrix
+        Y_p = em.predict(Xs_sparse[2])
+        self.assertEqual(Y_p.shape, (len(Ys[2]),))
+
+    def test_export(self):
+        """Test that the exported network reproduces predict_proba"""
+        em = EndModel(
+            seed=1,
+            batchnorm=True,
+            dropout=0.1,
+            layer_out_dims=[2, 10, 2],
+            verbose=False,
+        )
+        Xs, Ys = self.single_problem
+        em.train_model((Xs[0], Ys[0]), n_epochs=1, checkpoint=False)
+
+        EXPORT_PATH = "test_export_model.pt"
+        em.train()
+        em.export(EXPORT_PATH, Xs[1][:8])
+        # The model is returned to the mode it was in
+        self.assertTrue(em.training)
+        em.eval()
+        exported = torch.jit.load(EXPORT_PATH)
+        # Batches of any size can be run
+        Y_s = exported(Xs[2]).numpy()
+        self.assertTrue(np.allclose(Y_s, em.predict_proba(Xs[2]), atol=1e-6))
+
+        results = benchmark_export(em, EXPORT_PATH, Xs[2], n_requests=10)
+        self.assertEqual(set(results), {"eager", "exported", "speedup"})
+        self.assertLessEqual(results["exported"]["p50"], results["exported"]["p99"])
+        os.remove(EXPORT_PATH)
+
+    def test_quantize(self):
+        """Test dynamic int8 quantization, its report, and saving/loading"""
+        em = EndModel(seed=1, layer_out_dims=[2, 10, 2], verbose=False)
+        Xs, Ys = self.single_problem
+        em.train_model((Xs[0], Ys[0]), n_epochs=5, checkpoint=False)
+
+        em_q = em.quantize(valid_data=(Xs[1], Ys[1]))
+        self.assertIsInstance(em.network[-1], nn.Linear)
+        self.assertNotIsInstance(em_q.network[-1], nn.Linear)
+        # The training components are not copied
+        self.assertIsNone(em_q.optimizer)
+        self.assertIsNone(em_q.logger)
+        self.assertIsNotNone(em.optimizer)
+        report = em_q.quantization_report
+        self.assertEqual(report["score"], em.score((Xs[1], Ys[1]), verbose=False))
+        self.assertLess(abs(report["delta"]), 0.02)
+        self.assertGreater(em_q.score((Xs[2], Ys[2]), verbose=False), 0.95)
+
+        SAVE_PATH = "test_save_model_q.pkl"
+        em_q.save(SAVE_PATH)
+        em_q_2 = EndModel.load(SAVE_PATH)
+        self.assertTrue(
+            np.array_equal(em_q.predict_proba(Xs[2]), em_q_2.predict_proba(Xs[2]))
+        )
+        self.assertEqual(em_q_2.quantization_report, report)
+        os.remove(SAVE_PATH)
+
+    def test_save_size(self):
+        """Test that a trained model is saved without its training components"""
+        em = EndModel(seed=1, layer_out_dims=[2, 500, 500, 2], verbose=False)
+        Xs, Ys = self.single_problem
+        em.train_model((Xs[0], Ys[0]), n_epochs=1, checkpoint=False)
+        state_dict_size = sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in em.state_dict().values()
+        )
+        with tempfile.TemporaryDirectory() as save_dir:
+            save_path = os.path.join(save_dir, "model.pkl")
+            em.save(save_path)
+            # The Adam state alone would be twice the size of the weights
+            self.assertLess(os.path.getsize(save_path), 1.1 * state_dict_size)
+            em_2 = EndModel.load(save_path)
+            self.assertIsNone(em_2.optimizer)
+            self.assertIsNotNone(em.optimizer)
+
+    def test_save_over_mmap(self):
+        """Test saving a loaded model over the file it was memory-mapped from"""
+        input_module = nn.Linear(2, 10)
+        input_module.weight.requires_grad = False
+        em = EndModel(
+            seed=1, input_module=input_module, layer_out_dims=[10, 2], verbose=False
+        )
+        Xs, Ys = self.single_problem
+        with tempfile.TemporaryDirectory() as save_dir:
+            save_path = os.path.join(save_dir, "model.pkl")
+            em.save(save_path)
+            em_2 = EndModel.load(save_path)
+            em_2.train_model((Xs[0], Ys[0]), n_epochs=1, checkpoint=False)
+            # The frozen weights are still backed by the original file
+            em_2.save(save_path)
+            em_3 = EndModel.load(save_path)
+            for name, tensor in em_2.state_dict().items():
+                self.assertTrue(torch.equal(tensor, em_3.state_dict()[name]))
+            self.assertEqual(os.listdir(save_dir), ["model.pkl"])
+
     def test_save_and_load(self):
         """Test basic saving and loading"""
         em = EndModel(
@@ -197,6 +497,17 @@ class EndModelTest(unittest.TestCase):
         score_2 = em_2.score((Xs[2], Ys[2]), verbose=False)
         self.assertEqual(score, score_2)
 
+        # Weights can also be read into memory, and the loaded model trained
+        em_3 = EndModel.load(SAVE_PATH, mmap=False)
+        for name, tensor in em.state_dict().items():
+            self.assertTrue(torch.equal(tensor, em_3.state_dict()[name]))
+        em_3.train_model((Xs[0], Ys[0]), n_epochs=1, checkpoint=False)
+
+        # Models pickled whole (the previous format) still load
+        torch.save(em, SAVE_PATH)
+        em_4 = EndModel.load(SAVE_PATH)
+        self.assertEqual(score, em_4.score((Xs[2], Ys[2]), verbose=False))
+
         # Clean up
         os.remove(SAVE_PATH)
 
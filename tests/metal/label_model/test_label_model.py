@@ -50,6 +50,19 @@ class LabelModelTest(unittest.TestCase):
             data = SingleTaskTreeDepsGenerator(self.n, self.m, k=self.k, edge_prob=0.0)
             self._test_label_model(data)
 
+    def test_loss_tol(self):
+        np.random.seed(0)
+        data = SingleTaskTreeDepsGenerator(self.n, self.m, k=self.k, edge_prob=0.0)
+        label_model = LabelModel(k=data.k, verbose=False)
+        label_model.train_model(
+            data.L, class_balance=data.p, n_epochs=1000, loss_tol=1e-6
+        )
+        # Training stops early, once converged
+        self.assertLess(label_model.logger.unit_total, 1000)
+        c_probs_est = label_model.get_conditional_probs()
+        err = np.mean(np.abs(data.c_probs - c_probs_est))
+        self.assertLess(err, 0.025)
+
     def test_augmented_L_construction(self):
         # 5 LFs: a triangle, a connected edge to it, and a singleton source
         n = 3
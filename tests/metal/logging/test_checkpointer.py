@@ -1,10 +1,12 @@
 import copy
 import os
+import tempfile
 import unittest
 from shutil import rmtree
 
 import numpy as np
 import torch
+import torch.nn as nn
 
 from metal.end_model import EndModel
 
@@ -94,6 +96,118 @@ class CheckpointerTest(unittest.TestCase):
             model_path="checkpoints/model_checkpoint_2.pth",
         )
 
+    def test_checkpoint_async(self):
+        """Confirm that background checkpoints match the in-memory best model"""
+        em = EndModel(
+            seed=1,
+            batchnorm=False,
+            dropout=0.0,
+            layer_out_dims=[2, 10, 2],
+            verbose=False,
+        )
+        Xs, Ys = self.single_problem
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            em.train_model(
+                (Xs[0], Ys[0]),
+                valid_data=(Xs[1], Ys[1]),
+                n_epochs=5,
+                checkpoint=True,
+                checkpoint_every=1,
+                checkpoint_dir=checkpoint_dir,
+                checkpoint_async=True,
+            )
+            # All checkpoints have been written by the end of training
+            for iteration in range(1, 6):
+                self.assertTrue(
+                    os.path.exists(f"{checkpoint_dir}/model_checkpoint_{iteration}.pth")
+                )
+            best_state = em.checkpointer.best_state
+            self.assertEqual(best_state["iteration"], em.checkpointer.best_iteration)
+            saved_state = em.checkpointer.load(f"{checkpoint_dir}/best_model.pth")
+            for name, tensor in best_state["model"].items():
+                self.assertTrue(torch.equal(tensor, saved_state["model"][name]))
+
+    def test_checkpoint_rotation(self):
+        """Confirm that old checkpoints are deleted and frozen tensors are
+        stored only once"""
+        for checkpoint_async in [False, True]:
+            input_module = nn.Linear(2, 10)
+            input_module.weight.requires_grad = False
+            em = EndModel(
+                seed=1,
+                input_module=input_module,
+                batchnorm=False,
+                dropout=0.0,
+                layer_out_dims=[10, 2],
+                verbose=False,
+            )
+            Xs, Ys = self.single_problem
+            with tempfile.TemporaryDirectory() as checkpoint_dir:
+                em.train_model(
+                    (Xs[0], Ys[0]),
+                    valid_data=(Xs[1], Ys[1]),
+                    n_epochs=5,
+                    checkpoint=True,
+                    checkpoint_every=1,
+                    checkpoint_dir=checkpoint_dir,
+                    checkpoint_keep_last=2,
+                    checkpoint_incremental=True,
+                    checkpoint_async=checkpoint_async,
+                )
+                self.assertEqual(
+                    sorted(os.listdir(checkpoint_dir)),
+                    [
+                        "best_model.pth",
+                        "model_checkpoint_4.pth",
+                        "model_checkpoint_5.pth",
+                        "tensors",
+                    ],
+                )
+                tensor_files = os.listdir(os.path.join(checkpoint_dir, "tensors"))
+                frozen_files = [
+                    f for f in tensor_files if f.startswith("network.0.0.weight")
+                ]
+                self.assertEqual(frozen_files, ["network.0.0.weight.1.pt"])
+
+                # Checkpoints load as full states
+                state = em.checkpointer.restore(
+                    f"{checkpoint_dir}/model_checkpoint_5.pth"
+                )
+                for name, tensor in em.state_dict().items():
+                    self.assertTrue(torch.equal(tensor, state["model"][name]))
+
+    def test_checkpoint_incremental_resume(self):
+        """Confirm that resuming training does not overwrite the tensor files of
+        earlier incremental checkpoints"""
+        em = EndModel(
+            seed=1,
+            batchnorm=False,
+            dropout=0.0,
+            layer_out_dims=[2, 10, 2],
+            verbose=False,
+        )
+        Xs, Ys = self.single_problem
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            em.train_model(
+                (Xs[0], Ys[0]),
+                valid_data=(Xs[1], Ys[1]),
+                n_epochs=4,
+                checkpoint=True,
+                checkpoint_every=1,
+                checkpoint_dir=checkpoint_dir,
+                checkpoint_incremental=True,
+            )
+            checkpoint_path = f"{checkpoint_dir}/model_checkpoint_1.pth"
+            state = em.checkpointer.load(checkpoint_path)
+            em.resume_training(
+                (Xs[0], Ys[0]),
+                valid_data=(Xs[1], Ys[1]),
+                model_path=f"{checkpoint_dir}/model_checkpoint_2.pth",
+            )
+            state_2 = em.checkpointer.load(checkpoint_path)
+            for name, tensor in state["model"].items():
+                self.assertTrue(torch.equal(tensor, state_2["model"][name]))
+
     def test_checkpoint_metric(self):
         """Confirm that a non-standard checkpoint_metric can be used"""
         pass
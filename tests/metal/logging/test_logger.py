@@ -1,7 +1,16 @@
 import unittest
+from unittest.mock import patch
 
 import numpy as np
+import scipy.sparse as sparse
 import torch
+from torch.utils.data import DataLoader
+
+from metal.end_model import EndModel
+from metal.label_model import LabelModel
+from metal.logging import Logger
+from metal.multitask import MTEndModel
+from metal.multitask.task_graph import TaskGraph
 
 
 class LoggerTest(unittest.TestCase):
@@ -34,6 +43,22 @@ class LoggerTest(unittest.TestCase):
     def test_epochs(self):
         pass
 
+    def test_eval_only_on_log_events(self):
+        """Confirm that eval mode is only entered when a log event fires"""
+        em = EndModel(seed=1, layer_out_dims=[2, 10, 2], verbose=False)
+        Xs, Ys = self.single_problem
+        with patch.object(EndModel, "eval", wraps=em.eval) as mock_eval:
+            em.train_model(
+                (Xs[0], Ys[0]),
+                valid_data=(Xs[1], Ys[1]),
+                n_epochs=3,
+                checkpoint=False,
+                data_loader_config={"batch_size": 100},
+            )
+        # One call per epoch-end log event plus one at the end of training
+        # (final scoring is skipped since verbose=False)
+        self.assertEqual(mock_eval.call_count, 3 + 1)
+
     def test_tqdm(self):
         """Confirm that nothing breaks with tqdm on or off"""
         pass
@@ -42,6 +67,63 @@ class LoggerTest(unittest.TestCase):
         """Confirm non-default train metrics can be passed"""
         pass
 
+    def test_train_metrics_modes(self):
+        """Confirm standard train metrics can be computed in every mode"""
+        Xs, Ys = self.single_problem
+        for mode in ["full", "sample", "running"]:
+            logged = []
+            log = Logger.log
+
+            def record_log(logger, metrics_dict):
+                logged.append(dict(metrics_dict))
+                log(logger, metrics_dict)
+
+            em = EndModel(seed=1, layer_out_dims=[2, 10, 2], verbose=False)
+            with patch.object(Logger, "log", record_log):
+                em.train_model(
+                    (Xs[0], Ys[0]),
+                    valid_data=(Xs[1], Ys[1]),
+                    n_epochs=3,
+                    checkpoint=False,
+                    log_train_metrics=["loss", "accuracy"],
+                    log_train_metrics_mode=mode,
+                    log_train_sample_size=200,
+                )
+            self.assertEqual(len(logged), 3)
+            self.assertGreater(logged[-1]["train/accuracy"], 0.9)
+            # The Logger only keeps the indices of the train sample
+            self.assertFalse(
+                any(isinstance(v, DataLoader) for v in vars(em.logger).values())
+            )
+
+        # Outputs are not accumulated if no standard train metric is logged
+        em = EndModel(seed=1, layer_out_dims=[2, 10, 2], verbose=False)
+        em.train_model(
+            (Xs[0], Ys[0]),
+            n_epochs=1,
+            checkpoint=False,
+            log_train_metrics=["loss"],
+            log_train_metrics_mode="running",
+        )
+        self.assertEqual(em.logger.running_outputs, [])
+
+    def test_running_train_metrics_unsupported(self):
+        """Confirm that running train metrics are rejected for models that do
+        not pass their training outputs to the Logger"""
+        em = MTEndModel(layer_out_dims=[2, 4], task_graph=TaskGraph([2, 2]), seed=1)
+        Xs, Ys = self.single_problem
+        with self.assertRaises(ValueError):
+            em.train_model(
+                (Xs[0], [Ys[0], Ys[0]]),
+                n_epochs=1,
+                checkpoint=False,
+                log_train_metrics_mode="running",
+            )
+        lm = LabelModel(k=2, seed=1, verbose=False)
+        L = sparse.csr_matrix(np.random.randint(0, 3, (100, 4)))
+        with self.assertRaises(ValueError):
+            lm.train_model(L, n_epochs=1, log_train_metrics_mode="running")
+
     def test_valid_metrics(self):
         """Confirm non-default valid metrics can be passed"""
         pass
@@ -1,3 +1,4 @@
+import os
 import unittest
 
 import numpy as np
@@ -131,6 +132,28 @@ class MTEndModelTest(unittest.TestCase):
         score = em.score((self.Xs[2], self.Ys[2]), reduce="mean", verbose=False)
         self.assertGreater(score, 0.95)
 
+    def test_export(self):
+        """Test that the exported network reproduces predict_proba per task"""
+        edges = [(0, 1)]
+        cards = [2, 2]
+        tg = TaskHierarchy(cards, edges)
+        em = MTEndModel(
+            layer_out_dims=[2, 8, 4],
+            task_graph=tg,
+            seed=1,
+            verbose=False,
+            task_head_layers=[1, 2],
+        )
+        em.train_model((self.Xs[0], self.Ys[0]), n_epochs=1, checkpoint=False)
+
+        EXPORT_PATH = "test_export_mt_model.pt"
+        em.export(EXPORT_PATH, self.Xs[1][:8])
+        Y_s = torch.jit.load(EXPORT_PATH)(self.Xs[2])
+        self.assertEqual(len(Y_s), em.t)
+        for Y_ts, Y_ts_eager in zip(Y_s, em.predict_proba(self.Xs[2])):
+            self.assertTrue(np.allclose(Y_ts.numpy(), Y_ts_eager, atol=1e-6))
+        os.remove(EXPORT_PATH)
+
     def test_scoring(self):
         edges = [(0, 1)]
         cards = [2, 2]
@@ -172,6 +195,18 @@ class MTEndModelTest(unittest.TestCase):
                     task_specific_scores_score_task_method[i],
                 )
 
+        # Scoring all metrics at once matches scoring them one at a time
+        metrics = list(METRICS.keys())
+        scores = em.score(
+            (self.Xs[2], self.Ys[2]), metric=metrics, reduce=None, verbose=False
+        )
+        self.assertEqual(len(scores), len(metrics))
+        for metric, score in zip(metrics, scores):
+            single_score = em.score(
+                (self.Xs[2], self.Ys[2]), metric=metric, reduce=None, verbose=False
+            )
+            self.assertEqual(score, single_score)
+
 
 if __name__ == "__main__":
     unittest.main()
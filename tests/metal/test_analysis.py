@@ -1,9 +1,15 @@
+import os
+import tempfile
 import unittest
 
 import numpy as np
 import scipy.sparse as sparse
 
 from metal.analysis import (
+    ChunkedLFAnalysis,
+    ConfusionMatrix,
+    LFAnalysis,
+    _row_label_stats,
     error_buckets,
     label_conflict,
     label_coverage,
@@ -12,6 +18,8 @@ from metal.analysis import (
     lf_coverages,
     lf_empirical_accuracies,
     lf_overlaps,
+    lf_polarities,
+    lf_summary,
 )
 
 
@@ -31,6 +39,28 @@ class AnalysisTest(unittest.TestCase):
     def test_label_conflict(self):
         self.assertEqual(label_conflict(self.L), 0.4)
 
+    def test_lf_analysis_abstain(self):
+        # An LF that abstains everywhere adds no label columns
+        analysis = LFAnalysis(sparse.csr_matrix((5, 1)), self.Y)
+        self.assertEqual(analysis.label_coverage(), 0)
+        analysis = LFAnalysis(sparse.csr_matrix((5, 0)))
+        analysis.add(np.zeros(5))
+        for j in range(self.L.shape[1]):
+            analysis.add(self.L[:, j])
+        L = sparse.hstack([sparse.csr_matrix((5, 1)), self.L]).tocsr()
+        self.assertTrue(analysis.lf_summary().equals(lf_summary(L)))
+        self.assertEqual(analysis.label_conflict(), label_conflict(L))
+
+    def test_row_label_stats(self):
+        # Store an explicit zero, and use chunks smaller than L
+        L = self.L.copy()
+        L.data[L.data == 3] = 0
+        for chunk_size in [2, 100]:
+            n_votes, row_min, row_max = _row_label_stats(L, chunk_size=chunk_size)
+            self.assertEqual(list(n_votes), [2, 2, 0, 1, 2])
+            self.assertEqual(list(row_min), [1, 1, 0, 2, 1])
+            self.assertEqual(list(row_max), [1, 2, 0, 2, 2])
+
     def test_lf_empirical_accuracies(self):
         self.assertTrue(
             np.all(lf_empirical_accuracies(self.L, self.Y) == np.array([0.5, 0, 1]))
@@ -45,6 +75,53 @@ class AnalysisTest(unittest.TestCase):
     def test_lf_conflicts(self):
         self.assertTrue((lf_conflicts(self.L) == np.array([0.2, 0.4, 0.4])).all())
 
+    def test_lf_polarities(self):
+        self.assertEqual(lf_polarities(self.L), [1, [1, 3], [1, 2]])
+        self.assertEqual(lf_polarities(sparse.csr_matrix((2, 1))), [[]])
+
+    def test_lf_summary(self):
+        summary = lf_summary(self.L, Y=self.Y)
+        self.assertEqual(list(summary["Correct"]), [1, 0, 4])
+        self.assertEqual(list(summary["Incorrect"]), [1, 2, 0])
+        self.assertEqual(list(summary["Emp. Acc."]), [0.5, 0, 1])
+        self.assertEqual(list(summary["Conflicts"]), [0.2, 0.4, 0.4])
+
+    def test_lf_analysis(self):
+        L = self.L.toarray()
+        analysis = LFAnalysis(sparse.csr_matrix(L[:, :2]), self.Y)
+        self.assertEqual(analysis.add(L[:, 2]), 2)
+        self.assertTrue(analysis.lf_summary().equals(lf_summary(self.L, self.Y)))
+        self.assertEqual(analysis.label_conflict(), 0.4)
+
+        # Replace and remove LFs, checking against a full recomputation
+        L[:, 1] = [0, 1, 2, 2, 0]
+        analysis.replace(1, sparse.csr_matrix(L[:, 1:2]))
+        L_sparse = sparse.csr_matrix(L)
+        self.assertTrue(analysis.lf_summary().equals(lf_summary(L_sparse, self.Y)))
+        self.assertEqual(analysis.label_overlap(), label_overlap(L_sparse))
+        analysis.remove(0)
+        L_sparse = sparse.csr_matrix(L[:, 1:])
+        self.assertTrue(analysis.lf_summary().equals(lf_summary(L_sparse, self.Y)))
+        self.assertEqual(analysis.label_coverage(), label_coverage(L_sparse))
+        self.assertEqual(analysis.label_conflict(), label_conflict(L_sparse))
+
+    def test_chunked_lf_analysis(self):
+        summary = lf_summary(self.L, self.Y)
+        for n_jobs in [1, 2]:
+            analysis = ChunkedLFAnalysis(self.L, self.Y, n_jobs=n_jobs, shard_size=2)
+            self.assertTrue(analysis.lf_summary().equals(summary))
+            self.assertEqual(analysis.label_coverage(), 0.8)
+            self.assertEqual(analysis.label_overlap(), 0.6)
+            self.assertEqual(analysis.label_conflict(), 0.4)
+
+        # Chunks saved to disk are loaded by the workers
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [os.path.join(tmp_dir, f"L_{i}.npz") for i in range(2)]
+            sparse.save_npz(paths[0], self.L[:3])
+            sparse.save_npz(paths[1], self.L[3:])
+            analysis = ChunkedLFAnalysis(paths, [self.Y[:3], self.Y[3:]], n_jobs=2)
+            self.assertTrue(analysis.lf_summary().equals(summary))
+
     def test_error_buckets(self):
         gold = [1, 1, 2, 1, 2]
         pred = [1, 2, 1, 1, 2]
@@ -53,6 +130,18 @@ class AnalysisTest(unittest.TestCase):
         self.assertEqual(e_buckets[1, 2], [2])
         self.assertEqual(e_buckets[2, 2], [4])
         self.assertEqual(e_buckets[2, 1], [1])
+        e_buckets = error_buckets(gold, pred, X=np.array(["a", "b", "c", "d", "e"]))
+        self.assertEqual(e_buckets[1, 1], ["a", "d"])
+
+    def test_confusion_matrix(self):
+        conf = ConfusionMatrix()
+        conf.add(np.array([1, 1, 2]), np.array([1, 2, 1]))
+        # Later batches may introduce larger labels
+        conf.add(np.array([3, 1]), np.array([3, 0]))
+        mat = conf.compile()
+        self.assertTrue((mat == np.array([[1, 1, 0], [1, 0, 0], [0, 0, 1]])).all())
+        mat = conf.compile(trim=False)
+        self.assertEqual(mat[0, 1], 1)
 
 
 if __name__ == "__main__":
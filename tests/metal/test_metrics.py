@@ -1,14 +1,18 @@
 import unittest
 
 import numpy as np
+import sklearn.metrics as skm
 import torch
 
 from metal.metrics import (
+    MetricAccumulator,
     accuracy_score,
+    bootstrap_scores,
     coverage_score,
     f1_score,
     fbeta_score,
     metric_score,
+    metric_scores,
     precision_score,
     recall_score,
     roc_auc_score,
@@ -101,6 +105,117 @@ class MetricsTest(unittest.TestCase):
         probs = np.array([[0.9, 0.1], [0.6, 0.4], [0.65, 0.35], [0.2, 0.8]])
         score = roc_auc_score(gold, probs)
         self.assertEqual(score, 0.75)
+        # The binary case also accepts the probabilities of label 2 only
+        self.assertEqual(roc_auc_score(gold, probs[:, 1]), 0.75)
+
+    def test_roc_auc_multiclass(self):
+        np.random.seed(1)
+        gold = np.random.randint(1, 4, 500)
+        # Round the probs so that there are many ties
+        probs = np.round(np.random.dirichlet([1, 1, 1], 500), 1)
+        gold_s = np.eye(3)[gold - 1]
+        score = roc_auc_score(gold, probs)
+        self.assertAlmostEqual(score, skm.roc_auc_score(gold_s, probs))
+        approx = roc_auc_score(gold, probs, n_bins=10000)
+        self.assertAlmostEqual(approx, score, places=2)
+        score = roc_auc_score(gold, probs, ignore_in_gold=[3])
+        keep = gold != 3
+        self.assertAlmostEqual(
+            score, skm.roc_auc_score(gold_s[keep][:, :2], probs[keep][:, :2])
+        )
+
+    def test_metric_scores(self):
+        gold = [1, 1, 1, 1, 2, 3, 0]
+        pred = [0, 2, 1, 1, 2, 1, 3]
+        probs = np.full((7, 3), 1 / 3)
+        metrics = ["accuracy", "coverage", "precision", "recall", "f1", "roc-auc"]
+        scores = metric_scores(gold, pred, metrics, probs=probs, ignore_in_gold=[0])
+        for metric, score in zip(metrics, scores):
+            self.assertAlmostEqual(
+                score,
+                metric_score(gold, pred, metric, probs=probs, ignore_in_gold=[0]),
+            )
+        self.assertAlmostEqual(scores[0], 0.5)
+        self.assertRaises(ValueError, metric_scores, gold, pred, ["bad"])
+
+    def test_averages(self):
+        gold = [1, 1, 1, 1, 2, 3, -1]
+        pred = [0, 2, 1, 1, 2, 1, -1]
+        per_class = precision_score(gold, pred, average="per_class")
+        self.assertEqual(set(per_class), {-1, 1, 2, 3})
+        self.assertAlmostEqual(per_class[1], 2 / 3)
+        self.assertAlmostEqual(per_class[2], 0.5)
+        self.assertAlmostEqual(per_class[3], 0.0)
+        self.assertAlmostEqual(
+            precision_score(gold, pred, average="macro"), (2 / 3 + 0.5 + 1) / 4
+        )
+        # Micro precision is over the non-abstain predictions, like accuracy
+        self.assertAlmostEqual(recall_score(gold, pred, average="micro"), 4 / 7)
+        self.assertAlmostEqual(precision_score(gold, pred, average="micro"), 4 / 6)
+        self.assertAlmostEqual(
+            f1_score(gold, pred, average="per_class")[2],
+            f1_score(gold, pred, pos_label=2),
+        )
+        self.assertRaises(ValueError, precision_score, gold, pred, average="bad")
+
+    def test_metric_accumulator(self):
+        np.random.seed(1)
+        gold = np.random.randint(0, 4, 1000)
+        probs = np.random.dirichlet([1, 1, 1], 1000)
+        pred = probs.argmax(axis=1) + 1
+        metrics = ["accuracy", "coverage", "f1", "roc-auc"]
+        accumulator = MetricAccumulator(metrics, ignore_in_gold=[0])
+        for i in range(0, 1000, 64):
+            accumulator.update(gold[i : i + 64], pred[i : i + 64], probs[i : i + 64])
+        scores = accumulator.finalize()
+        exact = metric_scores(gold, pred, metrics, probs=probs, ignore_in_gold=[0])
+        for score, exact_score in zip(scores, exact):
+            self.assertAlmostEqual(score, exact_score)
+        self.assertRaises(ValueError, accumulator.update, gold, pred)
+
+        # With n_bins, ROC-AUC is approximated by binning the probabilities
+        accumulator = MetricAccumulator(["roc-auc"], ignore_in_gold=[0], n_bins=10000)
+        accumulator.update(gold, pred, probs)
+        self.assertAlmostEqual(accumulator.finalize()[0], exact[3], places=3)
+
+    def test_roc_auc_accumulator_confident(self):
+        # Confident predictions fall in the top bins, so only the exact AUC is
+        # accurate
+        np.random.seed(1)
+        gold = np.random.randint(1, 3, 1000)
+        logits = np.random.normal(8, 2, 1000) + 4 * (gold == 2)
+        probs = 1 / (1 + np.exp(-logits))
+        exact = roc_auc_score(gold, probs)
+        accumulator = MetricAccumulator(["roc-auc"], n_bootstrap=100, seed=1)
+        accumulator.update(gold, None, np.stack([1 - probs, probs], axis=1))
+        self.assertEqual(accumulator.finalize()[0], exact)
+        lower, upper = accumulator.intervals()[0]
+        self.assertLess(lower, exact)
+        self.assertGreater(upper, exact)
+        self.assertLess(roc_auc_score(gold, probs, n_bins=10000), exact - 0.05)
+
+    def test_bootstrap_scores(self):
+        np.random.seed(1)
+        gold = np.random.randint(1, 3, 2000)
+        probs = np.random.dirichlet([1, 1], 2000)
+        probs[:, 0] += gold == 1
+        probs /= probs.sum(axis=1, keepdims=True)
+        pred = probs.argmax(axis=1) + 1
+        metrics = ["accuracy", "precision", "roc-auc"]
+        results = bootstrap_scores(gold, pred, metrics, probs=probs, seed=1)
+        scores = metric_scores(gold, pred, metrics, probs=probs)
+        for (score, lower, upper), exact_score in zip(results, scores):
+            self.assertEqual(score, exact_score)
+            self.assertLess(lower, score)
+            self.assertGreater(upper, score)
+        # The accuracy interval matches its normal approximation
+        width = results[0][2] - results[0][1]
+        se = np.sqrt(scores[0] * (1 - scores[0]) / len(gold))
+        self.assertAlmostEqual(width, 2 * 1.96 * se, delta=0.005)
+        # The intervals are deterministic given a seed
+        self.assertEqual(
+            results, bootstrap_scores(gold, pred, metrics, probs=probs, seed=1)
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+import numpy as np
+import scipy.sparse as sparse
+import torch
+
+from metal.end_model import EndModel
+from metal.label_model import MajorityLabelVoter
+from metal.serving import InferenceServer
+
+
+class InferenceServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(1)
+        cls.em = EndModel(seed=1, layer_out_dims=[2, 10, 2], verbose=False)
+        cls.X = torch.rand(100, 2) * 2 - 1
+
+    def test_micro_batching(self):
+        server = InferenceServer(self.em, max_batch_size=16)
+        # Queue all requests before starting so that they are batched
+        futures = [server.submit(x) for x in self.X]
+        with server:
+            Y_s = np.stack([future.result() for future in futures])
+        self.assertTrue(np.allclose(Y_s, self.em.predict_proba(self.X), atol=1e-6))
+
+        stats = server.stats()
+        self.assertEqual(stats["requests"], len(self.X))
+        self.assertEqual(stats["mean_batch_size"], 100 / 7)
+        self.assertLessEqual(stats["p50"], stats["p99"])
+        self.assertGreater(stats["throughput"], 0)
+
+    def test_predict_async(self):
+        async def predict_all(server):
+            return await asyncio.gather(*[server.predict_async(x) for x in self.X])
+
+        with InferenceServer(self.em, max_batch_size=8) as server:
+            Y_s = np.stack(asyncio.run(predict_all(server)))
+        self.assertTrue(np.allclose(Y_s, self.em.predict_proba(self.X), atol=1e-6))
+
+    def test_label_model(self):
+        L = sparse.csr_matrix(np.array([[1, 1, 2], [2, 2, 0], [0, 1, 0]]))
+        lm = MajorityLabelVoter(k=2, verbose=False)
+        with InferenceServer(lm) as server:
+            Y_s = np.stack([server.predict(L[i]) for i in range(L.shape[0])])
+        self.assertTrue(np.array_equal(Y_s, lm.predict_proba(L)))
+
+    def test_errors(self):
+        with InferenceServer(self.em) as server:
+            with self.assertRaises(RuntimeError):
+                server.predict(torch.rand(3))
+
+
+if __name__ == "__main__":
+    unittest.main()